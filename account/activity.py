@@ -0,0 +1,90 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connection as db_connection
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+from . import presence
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityTracker:
+    """
+    Buffers users' last activity timestamps and writes them in bulk.
+
+    A user is recorded at most once per ``throttle`` seconds. Pending timestamps are flushed
+    with a single UPDATE right away when the buffer holds ``max_pending`` users and, with
+    ``background``, by a timer thread ``flush_interval`` seconds after the first of them was
+    buffered and when the process exits. A killed process loses at most ``flush_interval``
+    seconds of activity.
+    """
+
+    def __init__(self, throttle, flush_interval, max_pending, background=True):
+        self.throttle = throttle
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.background = background
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def touch(self, user):
+        now = timezone.now()
+        last_activity = user.last_activity
+        if last_activity is not None and (now - last_activity).total_seconds() < self.throttle:
+            return
+        user.last_activity = now
+        presence.mark_online(user.pk)
+
+        with self._lock:
+            self._pending[user.pk] = now
+            should_flush = len(self._pending) >= self.max_pending
+            if not should_flush and self.background and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if should_flush:
+            self.flush()
+
+    def _flush_in_background(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not write the last activity of users')
+        finally:
+            db_connection.close()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        from account.models import User
+
+        return User.objects.filter(pk__in=pending).update(last_activity=Case(
+            *(When(pk=pk, then=Value(moment)) for pk, moment in pending.items()),
+            output_field=DateTimeField(),
+        ))
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except DatabaseError as e:
+            logger.warning('Could not write the last activity of users at exit: %s', e)
+
+
+activity_tracker = ActivityTracker(
+    throttle=settings.LAST_ACTIVITY_THROTTLE,
+    flush_interval=settings.LAST_ACTIVITY_FLUSH_INTERVAL,
+    max_pending=settings.LAST_ACTIVITY_MAX_PENDING,
+    background=settings.LAST_ACTIVITY_BACKGROUND,
+)
+if activity_tracker.background:
+    atexit.register(activity_tracker.flush_at_exit)
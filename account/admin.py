@@ -77,7 +77,10 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
-    @admin.display(description=_('В сети'), boolean=True)
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_online()
+
+    @admin.display(description=_('В сети'), boolean=True, ordering='last_activity')
     def get_online_status(self, user):
         return user.online
     
@@ -85,7 +88,7 @@ class UserAdmin(BaseUserAdmin):
     def get_avatar(self, user):
         if user.avatar:
             return mark_safe(
-                f'<img src="{user.avatar.url}" alt="{user.get_full_name}" width="100px" />')
+                f'<img src="{user.list_avatar.url}" alt="{user.get_full_name}" width="100px" />')
         return '-'
 
 # Register your models here.
@@ -0,0 +1,85 @@
+import logging
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import CharField, F, Q, Value
+from django.db.models.functions import Coalesce
+from PIL import Image
+
+from account.images import render
+from account.models import User
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FIELDS = tuple(f'avatar_{size}' for size in settings.AVATAR_RENDITIONS)
+
+
+def delete_files(names):
+    storage = User._meta.get_field('avatar').storage
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def pending():
+    """ Users whose avatar was uploaded, replaced or removed since the renditions were made. """
+    return User.objects.filter(avatar_pending=True)
+
+
+def flag_changed():
+    """ Flags the changed avatars by comparing every user, for rows saved before the flag existed. """
+    return User.objects.annotate(current_avatar=Coalesce('avatar', Value(''), output_field=CharField())).exclude(
+        avatar_source=F('current_avatar'),
+    ).update(avatar_pending=True)
+
+
+def _swap(user, renditions):
+    """
+    Saves the renditions and swaps them in, unless the avatar was replaced or processed by another
+    worker meanwhile. The files they replace, and the previous upload, are deleted only once nothing
+    points at them.
+    """
+    values = dict.fromkeys(RENDITION_FIELDS, '')
+    for size, content in renditions.items():
+        field = User._meta.get_field(f'avatar_{size}')
+        values[field.name] = field.storage.save(field.generate_filename(user, f'{uuid4().hex}.webp'),
+                                                ContentFile(content))
+
+    source = user.avatar.name or ''
+    unchanged = Q(avatar=source) if source else Q(avatar__isnull=True) | Q(avatar='')
+    if User.objects.filter(unchanged, pk=user.pk, avatar_source=user.avatar_source).update(
+            avatar_source=source, avatar_pending=False, **values):
+        replaced = [getattr(user, name).name for name in RENDITION_FIELDS]
+        if user.avatar_source != source:
+            replaced.append(user.avatar_source)
+        delete_files(replaced)
+    else:
+        delete_files(values.values())
+
+
+def process(executor, batch_size):
+    """ Makes the renditions of a batch of changed avatars. Returns the number of users handled. """
+    users = list(pending().only('avatar', 'avatar_source', *RENDITION_FIELDS).order_by('pk')[:batch_size])
+    futures = {}
+    for user in users:
+        if not user.avatar:
+            continue
+        try:
+            with user.avatar.open('rb') as file:
+                content = file.read()
+        except OSError as exc:
+            logger.warning('Avatar %s of user %s can not be read: %s', user.avatar.name, user.pk, exc)
+            continue
+        futures[user.pk] = executor.submit(render, content, settings.AVATAR_RENDITIONS, settings.AVATAR_QUALITY)
+
+    for user in users:
+        renditions = {}
+        if user.pk in futures:
+            try:
+                renditions = futures[user.pk].result()
+            except (OSError, ValueError, Image.DecompressionBombError) as exc:
+                # The upload is served as it is
+                logger.warning('Avatar %s of user %s can not be rendered: %s', user.avatar.name, user.pk, exc)
+        _swap(user, renditions)
+    return len(users)
@@ -0,0 +1,27 @@
+import io
+
+from PIL import Image, ImageOps
+
+
+def render(content, renditions, quality):
+    """
+    Square WEBP renditions of an image, by name.
+
+    Runs in the worker processes, which is why this module does not import Django. The image is
+    cropped and scaled once to the largest rendition, the smaller ones are scaled from that, and
+    JPEGs are decoded at a reduced scale when the largest rendition allows it.
+    """
+    largest = max(renditions.values())
+    with Image.open(io.BytesIO(content)) as image:
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    image = ImageOps.fit(image, (largest, largest), Image.Resampling.LANCZOS)
+
+    result = {}
+    for name, side in renditions.items():
+        rendition = image if side == largest else image.resize((side, side), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        rendition.save(buffer, 'WEBP', quality=quality)
+        result[name] = buffer.getvalue()
+    return result
@@ -0,0 +1,38 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from account.avatars import flag_changed, process
+
+
+class Command(BaseCommand):
+    help = 'Makes the thumbnail, list and full size renditions of uploaded avatars.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Processes rendering images, one per CPU by default')
+        parser.add_argument('--batch-size', type=int, default=50, help='Avatars handled at once')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds between polls when there is nothing to do')
+        parser.add_argument('--once', action='store_true', help='Exit once every avatar is processed')
+        parser.add_argument('--mark-pending', action='store_true',
+                            help='First flag every changed avatar, for users saved before the pending flag existed')
+
+    def handle(self, *args, workers, batch_size, interval, once, mark_pending, **options):
+        if mark_pending:
+            self.stdout.write(f'Flagged {flag_changed()} changed avatars')
+        total = 0
+        with ProcessPoolExecutor(workers) as executor:
+            try:
+                while True:
+                    close_old_connections()
+                    handled = process(executor, batch_size)
+                    total += handled
+                    if handled:
+                        continue
+                    if once:
+                        break
+                    time.sleep(interval)
+            except KeyboardInterrupt:
+                pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} avatars'))
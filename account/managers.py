@@ -1,23 +1,28 @@
 from django.contrib.auth.models import UserManager as BaseUserManager
+from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.db.models import BooleanField, Case, When
-from django.utils import timezone
 
+from .presence import online_since
 
-class UserManager(BaseUserManager):
-    use_in_migrations = True
 
-    def get_queryset(self):
-        now = timezone.now()
-        online_time = now - timezone.timedelta(minutes=5)
+class UserQuerySet(models.QuerySet):
 
-        return super().get_queryset().annotate(
-            online=Case(
-                When(last_activity__gt=online_time, then=True),
+    def with_online(self):
+        return self.annotate(
+            is_online=Case(
+                When(last_activity__gt=online_since(), then=True),
                 default=False, output_field=BooleanField()
             ),
         )
-    
+
+    def online(self):
+        return self.filter(last_activity__gt=online_since())
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    use_in_migrations = True
+
     def _create_user(self, phone, password, **extra_fields):
         if not phone:
             raise ValueError(_('Phone must be set'))
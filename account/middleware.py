@@ -1,17 +1,38 @@
-from django.utils import timezone
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from account.activity import activity_tracker
 
 
 class LastUserActivityMiddleware:
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
-    def __call__(self, request):
+    @staticmethod
+    def touch(request):
         user = request.user
 
         if user.is_authenticated:
-            user.last_activity = timezone.now()
-            user.save()
+            activity_tracker.touch(user)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        self.touch(request)
 
         response = self.get_response(request)
 
-        return response
\ No newline at end of file
+        return response
+
+    async def __acall__(self, request):
+        # Without a session cookie the user is anonymous, so most API requests skip the thread hop
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            await sync_to_async(self.touch)(request)
+
+        return await self.get_response(request)
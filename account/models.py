@@ -2,16 +2,30 @@ from uuid import uuid4
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from django.core.files.images import get_image_dimensions
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django_resized import ResizedImageField
+from django_cleanup import cleanup
 from phonenumber_field.modelfields import PhoneNumberField
 
 from utils.models import TimeStampAbstractModel
+from . import presence
 from .managers import UserManager
 
 
+def validate_avatar(file):
+    if file.size > settings.AVATAR_MAX_UPLOAD_SIZE:
+        raise ValidationError(_('Файл аватарки слишком большой'))
+    width, height = get_image_dimensions(file)
+    if width is not None and max(width, height) > settings.AVATAR_MAX_SIDE:
+        raise ValidationError(_('Изображение аватарки слишком большое'))
+
+
+# Avatars are stored as uploaded and the renditions are made by the process_avatars workers,
+# which also delete replaced files, so django_cleanup must not delete them inline.
+@cleanup.ignore
 class User(AbstractUser):
 
     CLIENT = 'client'
@@ -28,28 +42,80 @@ class User(AbstractUser):
         verbose_name = _('пользователь')
         verbose_name_plural = _('пользователи')
         ordering = ('-date_joined',)
+        indexes = (
+            # Only the users waiting for avatar renditions, polled by the process_avatars workers
+            models.Index(fields=('id',), condition=models.Q(avatar_pending=True), name='user_avatar_pending_idx'),
+        )
 
     username = None
-    avatar = ResizedImageField(size=[500, 500], crop=['middle', 'center'],
-                               upload_to='avatars/', force_format='WEBP', quality=90, verbose_name=_('аватарка'),
-                               null=True, blank=True)
+    avatar = models.ImageField(_('аватарка'), upload_to='avatars/', null=True, blank=True,
+                               validators=[validate_avatar])
+    avatar_thumbnail = models.ImageField(_('аватарка, миниатюра'), upload_to='avatars/thumbnail/',
+                                        blank=True, editable=False)
+    avatar_list = models.ImageField(_('аватарка для списков'), upload_to='avatars/list/', blank=True, editable=False)
+    avatar_full = models.ImageField(_('аватарка, полный размер'), upload_to='avatars/full/', blank=True,
+                                   editable=False)
+    # Name of the uploaded avatar the renditions were made from
+    avatar_source = models.CharField(max_length=100, blank=True, editable=False)
+    # Set while the avatar differs from avatar_source
+    avatar_pending = models.BooleanField(default=False, editable=False)
     phone = PhoneNumberField(max_length=100, unique=True, verbose_name=_('номер телефона'))
     email = models.EmailField(blank=True, verbose_name=_('электронная почта'), unique=True)
     role = models.CharField(_('роль'), choices=ROLE, default=CLIENT, max_length=10)
-    last_activity = models.DateTimeField(blank=True,
-                                         null=True, verbose_name=_('последнее действие'), )
+    last_activity = models.DateTimeField(blank=True, null=True, db_index=True,
+                                         verbose_name=_('последнее действие'), )
 
     objects = UserManager()
 
     USERNAME_FIELD = 'phone'
     REQUIRED_FIELDS = []
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Lets a replaced upload that was never processed be told apart from a processed one
+        user.saved_avatar = user.__dict__.get('avatar')
+        return user
+
+    def save(self, *args, **kwargs):
+        if 'avatar' in self.__dict__:
+            self.avatar_pending = (self.avatar.name or '') != self.avatar_source
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'avatar' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'avatar_pending'}
+        super().save(*args, **kwargs)
+
     @property
     def get_full_name(self):
         return f'{self.last_name} {self.first_name}'
 
     get_full_name.fget.short_description = _('полное имя')
 
+    @property
+    def online(self):
+        annotated = self.__dict__.get('is_online')
+        if annotated is not None:
+            return annotated
+        return presence.is_online(self)
+
+    def avatar_rendition(self, size):
+        """ The ``size`` rendition of the avatar, or the uploaded image while it is not made yet. """
+        if self.avatar and self.avatar.name == self.avatar_source:
+            return getattr(self, f'avatar_{size}') or self.avatar
+        return self.avatar
+
+    @property
+    def thumbnail_avatar(self):
+        return self.avatar_rendition('thumbnail')
+
+    @property
+    def list_avatar(self):
+        return self.avatar_rendition('list')
+
+    @property
+    def full_avatar(self):
+        return self.avatar_rendition('full')
+
     def __str__(self):
         return f'{self.get_full_name or str(self.phone)}'
 
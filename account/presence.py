@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+KEY_PREFIX = 'account:presence:'
+
+
+def _key(user_id):
+    return f'{KEY_PREFIX}{user_id}'
+
+
+def online_since():
+    return timezone.now() - timezone.timedelta(seconds=settings.USER_ONLINE_TIMEOUT)
+
+
+def mark_online(user_id):
+    cache.set(_key(user_id), True, settings.USER_ONLINE_TIMEOUT)
+
+
+def is_online(user):
+    if user.last_activity is not None and user.last_activity > online_since():
+        return True
+    return cache.get(_key(user.pk), False)
@@ -1,7 +1,11 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
 
+from account.avatars import RENDITION_FIELDS, delete_files
 from account.models import User
+from account.tokens import token_cache
 
 
 @receiver(pre_save, sender=User)
@@ -11,3 +15,38 @@ def pre_save_user(instance, *args, **kwargs):
         instance.is_superuser = True
 
     return instance
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, *args, **kwargs):
+    # Dropped after commit, before it a request could cache the old rows again
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.delete(key))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_tokens(instance, *args, **kwargs):
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: token_cache.delete(*keys))
+
+
+@receiver(post_save, sender=User)
+def delete_replaced_upload(instance, *args, **kwargs):
+    """
+    An upload replaced before the renditions were made from it is not referenced anywhere any more.
+    A processed one is still the avatar_source and is deleted by the worker that replaces it.
+    """
+    if 'avatar' not in instance.__dict__:
+        return
+    saved, current = getattr(instance, 'saved_avatar', None), instance.avatar.name or ''
+    if saved and saved != current and saved != instance.avatar_source:
+        transaction.on_commit(lambda: delete_files([saved]))
+    instance.saved_avatar = current
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar_files(instance, *args, **kwargs):
+    names = {instance.avatar.name, instance.avatar_source, *(getattr(instance, name).name for name in RENDITION_FIELDS)}
+    transaction.on_commit(lambda: delete_files(names))
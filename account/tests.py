@@ -1,3 +1,168 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+from account.activity import ActivityTracker
+from account.avatars import flag_changed, pending, process
+from account.models import User, validate_avatar
+from account.tokens import TokenCache, issue_token, token_cache
+from api.authentication import CachedTokenAuthentication
+
+
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone='+996555000001', email='user@example.com', password='secret')
+        self.token = issue_token(self.user)
+        token_cache.set(self.token.key, self.token)
+        # The token cache of another worker process, only the default cache is shared with it
+        self.other = TokenCache(max_size=10, local_timeout=5, timeout=60)
+
+    def test_deleted_token_is_rejected_by_another_process(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertIsNone(self.other.get(self.token.key))
+
+    def test_local_copy_of_deleted_token_expires(self):
+        self.assertEqual(self.other.get(self.token.key), self.token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        with mock.patch('account.tokens.time.monotonic', return_value=time.monotonic() + 6):
+            self.assertIsNone(self.other.get(self.token.key))
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertIsNone(self.other.get(self.token.key))
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_cache_entries_are_dropped_when_the_transaction_commits(self):
+        key = self.token.key
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.token.delete()
+            self.assertEqual(self.other.get(key).key, key)
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(token_cache.get(key))
+
+    def test_login_rotates_the_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/auth/login/', {'phone': self.user.phone, 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['token'], self.token.key)
+        self.assertFalse(Token.objects.filter(key=self.token.key).exists())
+        self.assertIsNone(self.other.get(self.token.key))
+
+
+def image_file(name, side=32):
+    buffer = io.BytesIO()
+    Image.new('RGB', (side, side), 'red').save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+class AvatarTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(phone='+996555000001', email='user@example.com', password='secret')
+
+    def upload(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar = image_file(name)
+            self.user.save()
+        return self.user.avatar.name
+
+    def process(self):
+        with ThreadPoolExecutor(1) as executor:
+            return process(executor, 10)
+
+    def test_changed_avatar_is_pending_until_processed(self):
+        self.assertFalse(pending().exists())
+        name = self.upload('first.png')
+        self.assertEqual(list(pending()), [self.user])
+
+        self.assertEqual(self.process(), 1)
+        self.assertFalse(pending().exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_source, name)
+        self.assertTrue(default_storage.exists(self.user.avatar_thumbnail.name))
+
+    def test_rows_saved_before_the_flag_existed_are_flagged(self):
+        User.objects.filter(pk=self.user.pk).update(avatar='avatars/legacy.png')
+        self.assertFalse(pending().exists())
+        self.assertEqual(flag_changed(), 1)
+        self.assertEqual(list(pending()), [self.user])
+
+    def test_upload_replaced_before_processing_is_deleted(self):
+        first = self.upload('first.png')
+        second = self.upload('second.png')
+        self.assertFalse(default_storage.exists(first))
+        self.assertTrue(default_storage.exists(second))
+
+    def test_processed_upload_is_deleted_by_the_worker(self):
+        first = self.upload('first.png')
+        self.process()
+        self.user.refresh_from_db()
+        second = self.upload('second.png')
+        self.assertTrue(default_storage.exists(first))
+        self.process()
+        self.assertFalse(default_storage.exists(first))
+        self.assertTrue(default_storage.exists(second))
+
+    @override_settings(AVATAR_MAX_SIDE=16)
+    def test_large_image_is_rejected(self):
+        validate_avatar(image_file('small.png', side=16))
+        with self.assertRaises(ValidationError):
+            validate_avatar(image_file('large.png', side=17))
+
+    @override_settings(AVATAR_MAX_UPLOAD_SIZE=10)
+    def test_large_file_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            validate_avatar(image_file('avatar.png'))
+
+        self.client.force_login(self.user)
+        response = self.client.patch('/api/v1/auth/profile/',
+                                     encode_multipart(BOUNDARY, {'avatar': image_file('avatar.png')}),
+                                     content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('avatar', response.json())
+
+
+class ActivityTrackerTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone='+996555000001', email='user@example.com')
+
+    def test_pending_activity_is_written_without_another_request(self):
+        tracker = ActivityTracker(throttle=60, flush_interval=0.05, max_pending=100)
+        tracker.touch(self.user)
+        deadline = time.monotonic() + 5
+        while User.objects.get(pk=self.user.pk).last_activity is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_activity, self.user.last_activity)
+
+    def test_database_error_at_exit_is_logged(self):
+        tracker = ActivityTracker(throttle=60, flush_interval=60, max_pending=100, background=False)
+        tracker.touch(self.user)
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=OperationalError('no such table')), \
+                self.assertLogs('account.activity', 'WARNING'):
+            tracker.flush_at_exit()
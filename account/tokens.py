@@ -0,0 +1,85 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+KEY_PREFIX = 'account:token:'
+
+
+class TokenCache:
+    """
+    Token -> Token (with its user) lookups, from a small in-process LRU in front of the shared cache.
+
+    Entries of the shared cache live ``TOKEN_CACHE_TIMEOUT`` seconds and are deleted as soon as
+    a token is deleted or its user changes. The in-process copies live only
+    ``TOKEN_LOCAL_CACHE_TIMEOUT`` seconds, which bounds how long another process may still
+    accept a revoked token, provided the default cache is shared by all processes (see CACHES
+    and the core.W001 check). Local entries are kept pickled so that every request gets its own
+    copy of the user.
+    """
+
+    def __init__(self, max_size, local_timeout, timeout):
+        self.max_size = max_size
+        self.local_timeout = local_timeout
+        self.timeout = timeout
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                data, expires = entry
+                if expires > time.monotonic():
+                    self._local.move_to_end(key)
+                    return pickle.loads(data)
+                del self._local[key]
+        token = cache.get(f'{KEY_PREFIX}{key}')
+        if token is not None:
+            self._remember(key, token)
+        return token
+
+    def set(self, key, token):
+        cache.set(f'{KEY_PREFIX}{key}', token, self.timeout)
+        self._remember(key, token)
+
+    def _remember(self, key, token):
+        with self._lock:
+            self._local[key] = (pickle.dumps(token), time.monotonic() + self.local_timeout)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+    def delete(self, *keys):
+        cache.delete_many([f'{KEY_PREFIX}{key}' for key in keys])
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+
+
+token_cache = TokenCache(
+    max_size=settings.TOKEN_LOCAL_CACHE_SIZE,
+    local_timeout=settings.TOKEN_LOCAL_CACHE_TIMEOUT,
+    timeout=settings.TOKEN_CACHE_TIMEOUT,
+)
+
+
+def is_expired(token):
+    return token.created + timezone.timedelta(days=settings.TOKEN_EXPIRE_DAYS) < timezone.now()
+
+
+def issue_token(user, rotate=False):
+    """ Returns the user's token, replacing it with a new one when it has expired or ``rotate`` is set. """
+    with transaction.atomic():
+        token = Token.objects.select_for_update().filter(user=user).first()
+        if token is not None and not rotate and not is_expired(token):
+            return token
+        if token is not None:
+            token.delete()
+        return Token.objects.create(user=user)
@@ -11,6 +11,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 class CityViewSet(UltraModelViewSet):
     queryset = City.objects.all()
     serializer_class = CitySerializer
+    response_cache_models = (City,)
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
@@ -29,6 +30,7 @@ class CityViewSet(UltraModelViewSet):
 class ServiceViewSet(UltraModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServiceSerializer
+    response_cache_models = (Service,)
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
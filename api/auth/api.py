@@ -1,21 +1,21 @@
 from django.contrib.auth import authenticate
 from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.authtoken.models import Token
 from rest_framework import status, viewsets, filters
 from rest_framework.generics import GenericAPIView, get_object_or_404
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_registration.utils.responses import get_ok_response
 
-from api.mixins import PaginationBreaker, UltraModelViewSet
+from api.mixins import PaginationBreaker, RelatedByAction, UltraModelViewSet
 from .serializers import LoginSerializer, UserSerializer, ProfileSerializer, RegisterUserSerializer, \
     ResetPasswordSerializer, SendResetPasswordKeySerializer, ChangePasswordSerializer, ReadClientSerializer, \
     ClientSerializer, StaffSerializer
 from account.models import User, UserResetPassword, Client, Staff
+from account.tokens import issue_token
 
 from .services import UserPasswordResetManager
-from ..paginations import StandardResultsSetPagination
+from ..paginations import StandardResultsSetPagination, DateJoinedKeysetPagination
 from ..permissions import IsSuperAdmin, IsStaff
 
 
@@ -29,7 +29,8 @@ class LoginApiView(GenericAPIView):
         user = authenticate(phone=request.data['phone'], password=request.data['password'])
         if user:
             serializer = UserSerializer(user, many=False, context={'request': request})
-            token = Token.objects.get_or_create(user=user)[0].key
+            # A login revokes the token handed out before
+            token = issue_token(user, rotate=True).key
             data = {**serializer.data, 'token': f'{token}'}
             return Response(data, status.HTTP_200_OK)
         return Response({'login': _('Не существует пользователя или неверный пароль')},
@@ -47,7 +48,7 @@ class RegisterApiView(GenericAPIView):
         user = serializer.save()
         Client.objects.create(user=user)
         response_serializer = UserSerializer(user, many=False, context={'request': request})
-        token = Token.objects.get_or_create(user=user)[0].key
+        token = issue_token(user).key
         data = {**response_serializer.data, 'token': f'{token}'}
         return Response(data, status.HTTP_201_CREATED)
 
@@ -72,10 +73,19 @@ class ProfileApiView(GenericAPIView):
         return self.profile_response(request, instance)
 
 
-class UserViewSet(PaginationBreaker, viewsets.ReadOnlyModelViewSet):
+class UserViewSet(RelatedByAction, PaginationBreaker, viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    select_related_by_action = {
+        'list': ('client', 'staff__branch__city'),
+        'retrieve': ('client', 'staff__branch__city'),
+    }
+    prefetch_related_by_action = {
+        'list': ('groups', 'user_permissions', 'staff__branch__schedules'),
+        'retrieve': ('groups', 'user_permissions', 'staff__branch__schedules'),
+    }
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = DateJoinedKeysetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
                        filters.SearchFilter]
@@ -137,6 +147,10 @@ class ClientViewSet(UltraModelViewSet):
         'update': ClientSerializer,
         'retrieve': ReadClientSerializer,
     }
+    select_related_by_action = {
+        'list': ('user',),
+        'retrieve': ('user',),
+    }
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
@@ -160,6 +174,10 @@ class StaffViewSet(UltraModelViewSet):
         'update': StaffSerializer,
         'retrieve': ReadClientSerializer,
     }
+    select_related_by_action = {
+        'list': ('user',),
+        'retrieve': ('user',),
+    }
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
@@ -75,10 +75,13 @@ class UserSerializer(serializers.ModelSerializer):
     get_full_name = serializers.CharField(read_only=True)
     client = ClientForUserSerializer(read_only=True)
     staff = StaffForUserSerializer(read_only=True)
+    avatar = serializers.ImageField(source='full_avatar', read_only=True)
+    avatar_thumbnail = serializers.ImageField(source='thumbnail_avatar', read_only=True)
+    avatar_list = serializers.ImageField(source='list_avatar', read_only=True)
 
     class Meta:
         model = User
-        fields = '__all__'
+        exclude = ('avatar_full', 'avatar_source',)
 
         extra_kwargs = {
             'password': {'write_only': True},
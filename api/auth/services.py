@@ -1,7 +1,7 @@
-from django.core.mail import send_mail
 from django.utils.html import strip_tags
 
 from account.models import User, UserResetPassword
+from core.models import OutgoingEmail
 from django.conf import settings
 from urllib.parse import urlencode
 
@@ -26,7 +26,7 @@ class UserPasswordResetManager:
         subject, from_email, to = 'Oroz.com | Reset Password', settings.EMAIL_HOST_USER, self.user.email
         html_message = f'Your link to reset password <a href="{link}">here</a>'
         plain_message = strip_tags(html_message)
-        send_mail(subject, plain_message, from_email, [to], html_message=html_message)
+        OutgoingEmail.objects.enqueue(subject, plain_message, [to], html_body=html_message, from_email=from_email)
 
     def reset_password(self, new_password, key):
         password_reset = self._get_password_reset()
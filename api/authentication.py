@@ -0,0 +1,55 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+
+from account.tokens import is_expired, token_cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ TokenAuthentication that resolves tokens from the token cache and rejects expired tokens. """
+
+    def _check(self, token):
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        if is_expired(token):
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        return token.user, token
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            token_cache.set(key, token)
+        return self._check(token)
+
+    async def aauthenticate(self, request):
+        """
+        Counterpart of ``authenticate`` for async views. Tokens found in the token cache are
+        resolved without leaving the event loop, only misses go to the database.
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. No credentials provided.'))
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header. Token string should not contain invalid characters.'))
+
+        token = token_cache.get(key)
+        if token is None:
+            model = self.get_model()
+            try:
+                token = await model.objects.select_related('user').aget(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            token_cache.set(key, token)
+        return self._check(token)
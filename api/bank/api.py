@@ -1,16 +1,25 @@
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.utils.translation import gettext_lazy as _
-from rest_framework.generics import GenericAPIView, get_object_or_404
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import GenericAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from api.bank.serializers import BranchSerializer, ReadBranchSerializer, BranchScheduleSerializer, \
-    CreateRecordSerializer, \
-    ReadRecordSerializer, UpdateRecordSerializer, QueueSerializer, CreateQueueSerializer
-from api.mixins import UltraModelViewSet, UltraReadAndCreateModelViewSet
-from api.paginations import StandardResultsSetPagination
-from api.permissions import IsSuperAdmin
+    CreateRecordSerializer, BulkCreateRecordSerializer, FreeSlotsQuerySerializer, BranchStatsQuerySerializer, \
+    ReadRecordSerializer, UpdateRecordSerializer, QueueSerializer, CreateQueueSerializer, ClaimQueueSerializer, \
+    QueueEtaSerializer
+from api.mixins import FastSerializerByAction, UltraModelViewSet, UltraReadAndCreateModelViewSet
+from api.paginations import StandardResultsSetPagination, CreatedAtKeysetPagination
+from api.permissions import IsSuperAdmin, IsStaff
+from bank import stats
+from bank.availability import SlotAvailability
+from bank.board import board
+from bank.codes import is_valid_code
+from bank.bookings import RecordBulkImporter
 from bank.models import Branch, BranchSchedule, Record, Queue
+from django.conf import settings
 from django.utils import timezone
 from rest_framework.response import Response
 from rest_framework import status
@@ -25,6 +34,17 @@ class BranchViewSet(UltraModelViewSet):
         'update': ReadBranchSerializer,
         'retrieve': BranchSerializer,
     }
+    select_related_by_action = {
+        'create': ('city',),
+        'update': ('city',),
+    }
+    prefetch_related_by_action = {
+        'create': ('schedules',),
+        'list': ('schedules',),
+        'update': ('schedules',),
+        'retrieve': ('schedules',),
+    }
+    response_cache_models = (Branch, BranchSchedule)
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
@@ -35,15 +55,45 @@ class BranchViewSet(UltraModelViewSet):
     permission_classes_by_action = {
         'create': (IsAuthenticated, IsSuperAdmin,),
         'list': (AllowAny,),
+        'free_slots': (AllowAny,),
+        'stats': (IsAuthenticated, IsStaff,),
         'update': (IsAuthenticated, IsSuperAdmin,),
         'retrieve': (AllowAny,),
         'destroy': (IsAuthenticated, IsSuperAdmin),
     }
 
+    @action(methods=['GET'], detail=True)
+    def free_slots(self, request, *args, **kwargs):
+        branch = self.get_object()
+        query_serializer = FreeSlotsQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        service = query_serializer.validated_data['service']
+        start_date = query_serializer.validated_data.get('date') or branch.local_date()
+        slots = SlotAvailability(branch.id, service.id).free_slots(
+            start_date, query_serializer.validated_data['days'])
+        return Response({
+            'slot_minutes': settings.RECORD_SLOT_MINUTES,
+            'days': [{'date': day, 'slots': day_slots} for day, day_slots in slots.items()],
+        })
+
+    @action(methods=['GET'], detail=True)
+    def stats(self, request, *args, **kwargs):
+        branch = self.get_object()
+        query_serializer = BranchStatsQuerySerializer(data=request.query_params, context={'branch': branch})
+        query_serializer.is_valid(raise_exception=True)
+        service = query_serializer.validated_data.get('service')
+        return Response(stats.report(
+            branch,
+            query_serializer.validated_data['start'],
+            query_serializer.validated_data['end'],
+            service.id if service is not None else None,
+        ))
+
 
 class BranchScheduleViewSet(UltraModelViewSet):
     queryset = BranchSchedule.objects.all()
     serializer_class = BranchScheduleSerializer
+    response_cache_models = (BranchSchedule,)
     pagination_class = StandardResultsSetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
@@ -59,15 +109,21 @@ class BranchScheduleViewSet(UltraModelViewSet):
     }
 
 
-class RecordViewSet(UltraModelViewSet):
+class RecordViewSet(FastSerializerByAction, UltraModelViewSet):
     queryset = Record.objects.all()
     serializer_classes = {
         'create': CreateRecordSerializer,
+        'bulk_create': BulkCreateRecordSerializer,
         'list': ReadRecordSerializer,
         'update': UpdateRecordSerializer,
         'retrieve': ReadRecordSerializer,
     }
+    select_related_by_action = {
+        'list': ('user', 'branch__city', 'service'),
+        'retrieve': ('user', 'branch__city', 'service'),
+    }
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = CreatedAtKeysetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
                        filters.SearchFilter]
@@ -76,21 +132,45 @@ class RecordViewSet(UltraModelViewSet):
     search_fields = ['name']
     permission_classes_by_action = {
         'create': (IsAuthenticated,),
+        'bulk_create': (IsAuthenticated,),
         'list': (AllowAny,),
         'update': (IsAuthenticated, IsSuperAdmin,),
         'retrieve': (AllowAny,),
         'destroy': (IsAuthenticated, IsSuperAdmin),
     }
 
-
-class QueueViewSet(UltraReadAndCreateModelViewSet):
+    @action(methods=['POST'], detail=False)
+    def bulk_create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        records, import_errors = RecordBulkImporter(request.user).run(serializer.validated_data['items'])
+        errors = sorted(serializer.validated_data['errors'] + import_errors, key=lambda error: error['index'])
+        if not records:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif errors:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({
+            'created': ReadRecordSerializer(records, many=True, context=self.get_serializer_context()).data,
+            'errors': errors,
+        }, status=response_status)
+
+
+class QueueViewSet(FastSerializerByAction, UltraReadAndCreateModelViewSet):
     queryset = Queue.objects.all()
     serializer_classes = {
         'create': CreateQueueSerializer,
         'list': QueueSerializer,
         'retrieve': QueueSerializer,
+        'eta': QueueEtaSerializer,
+    }
+    select_related_by_action = {
+        'list': ('user', 'branch__city', 'service'),
+        'retrieve': ('user', 'branch__city', 'service'),
     }
     pagination_class = StandardResultsSetPagination
+    cursor_pagination_class = CreatedAtKeysetPagination
     filter_backends = [DjangoFilterBackend,
                        filters.OrderingFilter,
                        filters.SearchFilter]
@@ -102,27 +182,39 @@ class QueueViewSet(UltraReadAndCreateModelViewSet):
         'list': (AllowAny,),
         'update': (IsAuthenticated, IsSuperAdmin,),
         'retrieve': (AllowAny,),
+        'eta': (AllowAny,),
         'destroy': (IsAuthenticated, IsSuperAdmin),
     }
 
+    def perform_create(self, serializer):
+        queue = serializer.save()
+        board.publish_queue(queue, 'created')
+
+    @action(methods=['GET'], detail=True)
+    def eta(self, request, *args, **kwargs):
+        queue = self.get_object()
+        now = timezone.now()
+        people_ahead, estimated_wait = Queue.objects.estimate_wait(queue, now)
+        serializer = self.get_serializer({
+            'id': queue.id,
+            'slug': queue.slug,
+            'status': queue.status,
+            'people_ahead': people_ahead,
+            'estimated_wait': estimated_wait,
+            'estimated_call_at': now + timezone.timedelta(seconds=estimated_wait),
+        })
+        return Response(serializer.data)
+
 
 class QueueByRecordGenericAPIView(GenericAPIView):
 
     serializer_class = QueueSerializer
 
     def get(self, request, code, *args, **kwargs):
-        record = get_object_or_404(Record, code=code, status=Record.WAITING)
-        now = timezone.now().date()
-        queues = Queue.objects.filter(created_at__date=now)
-        queue = Queue.objects.create(
-            user=record.user,
-            service=record.service,
-            branch=record.branch,
-            value=queues.count() + 1,
-            type=Queue.RECORDED_CLIENT
-        )
-        record.status = Record.COMPLETED
-        record.save()
+        queue = Queue.objects.check_in(code) if is_valid_code(code) else None
+        if queue is None:
+            raise NotFound()
+        board.publish_queue(queue, 'created')
         serializer = self.get_serializer(instance=queue)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -130,14 +222,14 @@ class QueueByRecordGenericAPIView(GenericAPIView):
 class NextQueueGenericAPIView(GenericAPIView):
 
     serializer_class = QueueSerializer
+    query_serializer_class = ClaimQueueSerializer
 
     def get(self, request, *args, **kwargs):
-        now = timezone.now().date()
-        queue = Queue.objects.filter(created_at__date=now, status=Queue.WAITING).order_by('value')
-        if queue.exists():
-            queue = queue.first()
-            queue.status = Queue.IN_PROGRESS
-            queue.save()
+        query_serializer = self.query_serializer_class(data=request.query_params, context={'request': request})
+        query_serializer.is_valid(raise_exception=True)
+        queue = Queue.objects.claim_next(**query_serializer.validated_data)
+        if queue is not None:
+            board.publish_queue(queue, 'claimed')
             serializer = self.get_serializer(instance=queue)
             return Response(serializer.data)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -146,12 +238,13 @@ class NextQueueGenericAPIView(GenericAPIView):
 class CompleteQueueGenericAPIView(GenericAPIView):
 
     serializer_class = QueueSerializer
-    queryset = Queue.objects.filter(status=Queue.IN_PROGRESS)
+    queryset = Queue.objects.all()
     lookup_field = 'id'
 
-    def get(self, request, *args, **kwargs):
+    def get(self, request, id, *args, **kwargs):
+        if not Queue.objects.complete(id):
+            raise NotFound()
         queue = self.get_object()
-        queue.status = Queue.COMPLETED
-        queue.save()
+        board.publish_queue(queue, 'completed')
         serializer = self.get_serializer(instance=queue)
         return Response(serializer.data)
@@ -0,0 +1,119 @@
+from functools import wraps
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+
+from api.authentication import CachedTokenAuthentication
+from api.bank.serializers import ClaimQueueSerializer, CreateQueueSerializer, QueueSerializer
+from api.renderers import ORJSONRenderer
+from bank.board import board
+from bank.codes import is_valid_code
+from bank.models import Queue
+
+renderer = ORJSONRenderer()
+authentication = CachedTokenAuthentication()
+
+
+def _response(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(renderer.render(data), status=status_code, headers=headers,
+                        content_type=renderer.media_type)
+
+
+def async_api_view(methods, authenticated=False):
+    """
+    Turns an async function into a JSON endpoint answering like the DRF views it mirrors:
+    the same token authentication, errors and rendering, without leaving the event loop
+    except for the database work the view hands to ``sync_to_async``.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                result = await authentication.aauthenticate(request)
+                request.user, request.auth = result if result is not None else (AnonymousUser(), None)
+                if authenticated and result is None:
+                    raise exceptions.NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                headers = None
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    headers = {'WWW-Authenticate': authentication.authenticate_header(request)}
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                return _response(data, exc.status_code, headers)
+
+        # Only token authentication is accepted, so there is no session to protect from CSRF
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _check_in(request, code):
+    queue = Queue.objects.check_in(code)
+    if queue is None:
+        raise exceptions.NotFound()
+    board.publish_queue(queue, 'created')
+    return QueueSerializer(queue, context={'request': request}).data
+
+
+def _claim(request):
+    serializer = ClaimQueueSerializer(data=request.GET, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    queue = Queue.objects.claim_next(**serializer.validated_data)
+    if queue is None:
+        return None
+    board.publish_queue(queue, 'claimed')
+    return QueueSerializer(queue, context={'request': request}).data
+
+
+def _complete(request, id):
+    if not Queue.objects.complete(id):
+        raise exceptions.NotFound()
+    queue = Queue.objects.select_related('user', 'branch__city', 'service').get(pk=id)
+    board.publish_queue(queue, 'completed')
+    return QueueSerializer(queue, context={'request': request}).data
+
+
+def _create(request, data):
+    serializer = CreateQueueSerializer(data=data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    queue = serializer.save()
+    board.publish_queue(queue, 'created')
+    return serializer.data
+
+
+@async_api_view(methods=('GET',))
+async def queue_by_record(request, code):
+    if not is_valid_code(code):
+        raise exceptions.NotFound()
+    data = await sync_to_async(_check_in)(request, code)
+    return _response(data, status.HTTP_201_CREATED)
+
+
+@async_api_view(methods=('GET',))
+async def next_queue(request):
+    data = await sync_to_async(_claim)(request)
+    if data is None:
+        return HttpResponse(status=status.HTTP_204_NO_CONTENT)
+    return _response(data)
+
+
+@async_api_view(methods=('GET',))
+async def complete_queue(request, id):
+    data = await sync_to_async(_complete)(request, id)
+    return _response(data)
+
+
+@async_api_view(methods=('POST',), authenticated=True)
+async def create_queue(request):
+    try:
+        data = orjson.loads(request.body) if request.content_type == 'application/json' else request.POST
+    except orjson.JSONDecodeError as exc:
+        raise exceptions.ParseError(f'JSON parse error - {exc}')
+    data = await sync_to_async(_create)(request, data)
+    return _response(data, status.HTTP_201_CREATED)
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, StreamingHttpResponse
+
+from bank.board import board, snapshot
+from bank.models import Branch
+
+QUEUE_BOARD_PATH = re.compile(r'^/ws/v1/bank/branches/(?P<branch_id>\d+)/queue-board/$')
+KEEPALIVE_SECONDS = 25
+
+
+async def _branch_exists(branch_id):
+    return await Branch.objects.filter(id=branch_id).aexists()
+
+
+async def _snapshot_payload(branch_id):
+    rows = await sync_to_async(snapshot)(branch_id)
+    return json.dumps({'event': 'snapshot', 'tickets': rows}, default=str, separators=(',', ':'))
+
+
+async def queue_board_websocket(scope, receive, send):
+    """ ASGI websocket endpoint: sends a snapshot of the branch queue, then every ticket event. """
+    branch_id = int(QUEUE_BOARD_PATH.match(scope['path']).group('branch_id'))
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if not await _branch_exists(branch_id):
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    subscription = board.subscribe(branch_id)
+    receiver = asyncio.ensure_future(receive())
+    getter = asyncio.ensure_future(subscription.get())
+    try:
+        await send({'type': 'websocket.accept'})
+        await send({'type': 'websocket.send', 'text': await _snapshot_payload(branch_id)})
+        while True:
+            done, _ = await asyncio.wait({receiver, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                payload = getter.result()
+                if payload is None:
+                    await send({'type': 'websocket.close', 'code': 4000})
+                    return
+                await send({'type': 'websocket.send', 'text': payload})
+                getter = asyncio.ensure_future(subscription.get())
+            if receiver in done:
+                if receiver.result()['type'] == 'websocket.disconnect':
+                    return
+                receiver = asyncio.ensure_future(receive())
+    finally:
+        receiver.cancel()
+        getter.cancel()
+        subscription.close()
+
+
+async def queue_board_events(request, branch_id):
+    """ The same feed as the websocket, as server-sent events. Needs to be served over ASGI. """
+    if not await _branch_exists(branch_id):
+        raise Http404
+
+    async def stream():
+        subscription = board.subscribe(branch_id)
+        try:
+            yield f'data: {await _snapshot_payload(branch_id)}\n\n'
+            while True:
+                try:
+                    payload = await asyncio.wait_for(subscription.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if payload is None:
+                    break
+                yield f'data: {payload}\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from . import api
+from . import api, async_api, consumers
 from rest_framework import routers
 
 router = routers.DefaultRouter()
@@ -12,5 +12,10 @@ urlpatterns = [
     path('queue-by-record/<str:code>/', api.QueueByRecordGenericAPIView.as_view()),
     path('next-queue/', api.NextQueueGenericAPIView.as_view()),
     path('complete-queue/<int:id>/', api.CompleteQueueGenericAPIView.as_view()),
+    path('async/queue-by-record/<str:code>/', async_api.queue_by_record),
+    path('async/next-queue/', async_api.next_queue),
+    path('async/complete-queue/<int:id>/', async_api.complete_queue),
+    path('async/queues/', async_api.create_queue),
+    path('branches/<int:branch_id>/queue-board/events/', consumers.queue_board_events),
     path('', include(router.urls))
 ]
\ No newline at end of file
@@ -1,10 +1,14 @@
 from datetime import datetime
 
+from django.db import IntegrityError, transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
-from django.utils import timezone
+from api.fast import register_computed
 from api.serializers import CitySerializer, ServiceSerializer
+from bank.bookings import booking_errors
 from bank.models import Branch, BranchSchedule, Record, Queue
+from bank.schedules import schedule_index
+from core.models import Service
 from utils.serializers import ShortDescUserSerializer
 
 
@@ -39,12 +43,41 @@ class BranchSerializer(serializers.ModelSerializer):
         return branch
 
 
+class FreeSlotsQuerySerializer(serializers.Serializer):
+    service = serializers.PrimaryKeyRelatedField(queryset=Service.objects.all())
+    date = serializers.DateField(required=False)
+    days = serializers.IntegerField(min_value=1, max_value=31, default=7)
+
+
+class BranchStatsQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    service = serializers.PrimaryKeyRelatedField(queryset=Service.objects.all(), required=False)
+
+    MAX_DAYS = 366
+
+    def validate(self, attrs):
+        end = attrs.get('end') or self.context['branch'].local_date()
+        start = attrs.get('start') or end.replace(day=1)
+        if start > end:
+            raise serializers.ValidationError({'start': [_('Начало периода позже конца')]})
+        if (end - start).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'end': [_(f'Период не может быть больше {self.MAX_DAYS} дней')]})
+        attrs['start'], attrs['end'] = start, end
+        return attrs
+
+
 class BranchScheduleSerializer(serializers.ModelSerializer):
     class Meta:
         model = BranchSchedule
         fields = '__all__'
 
 
+def slot_taken_error(meeting_date):
+    return serializers.ValidationError({'branch': [
+        _(f'{meeting_date.date()} в {meeting_date.time()} в отделение уже есть запись')]})
+
+
 class CreateRecordSerializer(serializers.ModelSerializer):
     user = serializers.CurrentUserDefault()
 
@@ -56,17 +89,45 @@ class CreateRecordSerializer(serializers.ModelSerializer):
         branch = attrs.get('branch')
         meeting_date = attrs.get('meeting_date')
         service = attrs.get('service')
-        if not branch.is_open:
-            raise serializers.ValidationError({'branch': [_('Отделение закрыто')]})
-        record = Record.objects.filter(
+        taken = Record.objects.filter(
             branch=branch,
             meeting_date=meeting_date,
             service=service,
             status=Record.WAITING,
-        )
-        if record.exists():
-            raise serializers.ValidationError({'branch': [
-                _(f'{meeting_date.date()} в {meeting_date.time()} в отделение уже есть запись')]})
+        ).exists()
+        errors = booking_errors(branch.pk, meeting_date, taken)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise slot_taken_error(validated_data['meeting_date'])
+
+
+class BulkRecordItemSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    branch = serializers.IntegerField(min_value=1)
+    service = serializers.IntegerField(min_value=1)
+    meeting_date = serializers.DateTimeField()
+
+
+class BulkCreateRecordSerializer(serializers.Serializer):
+    records = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=1000)
+
+    def validate(self, attrs):
+        items, errors = [], []
+        for index, record in enumerate(attrs['records']):
+            item_serializer = BulkRecordItemSerializer(data=record)
+            if item_serializer.is_valid():
+                items.append((index, item_serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': item_serializer.errors})
+        attrs['items'] = items
+        attrs['errors'] = errors
         return attrs
 
 
@@ -79,6 +140,9 @@ class ReadBranchForRecordSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+register_computed(Branch, 'is_open', ('id',), schedule_index.is_open)
+
+
 class ReadRecordSerializer(serializers.ModelSerializer):
     user = ShortDescUserSerializer()
     branch = ReadBranchForRecordSerializer()
@@ -94,6 +158,27 @@ class UpdateRecordSerializer(serializers.ModelSerializer):
         model = Record
         fields = ('status',)
 
+    def validate(self, attrs):
+        record = self.instance
+        if attrs.get('status') != Record.WAITING or record.status == Record.WAITING:
+            return attrs
+        taken = Record.objects.filter(
+            branch_id=record.branch_id,
+            service_id=record.service_id,
+            meeting_date=record.meeting_date,
+            status=Record.WAITING,
+        ).exclude(pk=record.pk)
+        if taken.exists():
+            raise slot_taken_error(record.meeting_date)
+        return attrs
+
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise slot_taken_error(instance.meeting_date)
+
 
 class CreateQueueSerializer(serializers.ModelSerializer):
     class Meta:
@@ -101,10 +186,7 @@ class CreateQueueSerializer(serializers.ModelSerializer):
         fields = ('branch', 'service', 'type', 'user',)
 
     def create(self, validated_data):
-        now = timezone.now().date()
-        queues = Queue.objects.filter(created_at__date=now)
-        validated_data['value'] = queues.count() + 1
-        return super().create(validated_data)
+        return Queue.objects.issue(**validated_data)
 
 
 class QueueSerializer(serializers.ModelSerializer):
@@ -116,3 +198,26 @@ class QueueSerializer(serializers.ModelSerializer):
     class Meta:
         model = Queue
         fields = '__all__'
+
+
+class ClaimQueueSerializer(serializers.Serializer):
+    branch = serializers.PrimaryKeyRelatedField(queryset=Branch.objects.all(), required=False)
+    service = serializers.PrimaryKeyRelatedField(queryset=Service.objects.all(), required=False)
+    window = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if attrs.get('branch') is None:
+            staff = getattr(self.context['request'].user, 'staff', None)
+            if staff is None:
+                raise serializers.ValidationError({'branch': [_('Обязательное поле.')]})
+            attrs['branch'] = staff.branch
+        return attrs
+
+
+class QueueEtaSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    slug = serializers.CharField()
+    status = serializers.CharField()
+    people_ahead = serializers.IntegerField()
+    estimated_wait = serializers.IntegerField(help_text=_('секунд'))
+    estimated_call_at = serializers.DateTimeField()
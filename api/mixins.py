@@ -1,5 +1,11 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
 import django
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.translation import get_language
 from rest_framework import mixins
 from rest_framework import serializers
 from rest_framework import status
@@ -8,7 +14,11 @@ from rest_framework.response import Response
 from rest_framework.serializers import Serializer
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from utils.constants import USE_PAGINATION
+from api.fast import FastListSerializer, compile_serializer
+from api.streaming import serialize_rows, streaming_response
+from utils.constants import USE_PAGINATION, PAGINATION, CURSOR, EXPORT
+from utils.cache import model_versions
+from utils.deletion import bulk_delete
 from utils.utils import make_bool
 
 
@@ -16,11 +26,31 @@ class SerializersByAction:
     serializer_classes: dict
 
     def get_serializer_class(self):
+        if not hasattr(self, 'serializer_classes'):
+            return super().get_serializer_class()
         if self.action == 'partial_update' or self.action == 'update_partial':
             return self.serializer_classes.get('update', None)
         return self.serializer_classes.get(self.action, None)
 
 
+class RelatedByAction:
+    select_related_by_action = {}
+    prefetch_related_by_action = {}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        action = self.action
+        if action == 'partial_update' or action == 'update_partial':
+            action = 'update'
+        select_related = self.select_related_by_action.get(action, None)
+        prefetch_related = self.prefetch_related_by_action.get(action, None)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
 class PermissionByAction:
     permission_classes_by_action = {}
 
@@ -46,16 +76,135 @@ class PermissionByMethod:
 
 
 class PaginationBreaker:
+    cursor_pagination_class = None
 
     def _break_pagination(self, request):
         use_pagination = make_bool(request.GET.get(USE_PAGINATION, True))
         if not use_pagination:
             self.pagination_class = None
+        elif request.GET.get(PAGINATION) == CURSOR and self.cursor_pagination_class is not None:
+            self.pagination_class = self.cursor_pagination_class
+        return use_pagination
 
     def list(self, request, *args, **kwargs):
-        self._break_pagination(request)
+        if not self._break_pagination(request):
+            return self.stream_list(request)
         return super().list(request, *args, **kwargs)
 
+    def stream_list(self, request):
+        """ Unpaginated list as a JSON array, NDJSON or CSV stream, serialized row by row. """
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = serialize_rows(queryset, self.get_row_serializer())
+        return streaming_response(request._request, rows, request.GET.get(EXPORT), queryset.model._meta.model_name)
+
+    def get_row_serializer(self):
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        return lambda instance: serializer_class(instance, context=context).data
+
+
+class FastSerializerByAction:
+    """
+    Serializes the rows of ``fast_serializer_actions`` with the compiled form of the action's
+    serializer, fed from a ``.values()`` query instead of model instances.
+    """
+    fast_serializer_actions = ('list',)
+
+    def get_fast_serializer(self):
+        if self.action not in self.fast_serializer_actions:
+            return None
+        return compile_serializer(self.get_serializer_class())
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        compiled = self.get_fast_serializer()
+        if compiled is not None:
+            queryset = compiled.values(queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        compiled = self.get_fast_serializer()
+        if compiled is None or not kwargs.get('many') or not args:
+            return super().get_serializer(*args, **kwargs)
+        return FastListSerializer(compiled.bind(self.get_serializer_context()), args[0])
+
+    def get_row_serializer(self):
+        compiled = self.get_fast_serializer()
+        if compiled is None:
+            return super().get_row_serializer()
+        return compiled.bind(self.get_serializer_context())
+
+
+class ResponseCache:
+    """
+    Caches rendered list/retrieve responses of viewsets that declare ``response_cache_models``.
+
+    The key is built from the host, path, query params, language, renderer and the versions of
+    the declared models, which their save/delete signals replace after commit. The host is part
+    of it because pagination links are absolute. Responses carry a strong ETag and a matching
+    If-None-Match is answered with 304 without querying or serializing anything.
+    Only formats in ``response_cache_formats`` are cached, the browsable API renders per user.
+    The versions reach every worker only through a shared default cache (see CACHES).
+    """
+    response_cache_models = ()
+    response_cache_actions = ('list', 'retrieve')
+    response_cache_formats = ('json',)
+    response_cache_timeout = 60 * 60 * 24
+    response_cache_headers = ('Vary', 'Allow')
+
+    def _response_cache_key(self, request):
+        raw = '|'.join((
+            request.get_host(),
+            request.path,
+            urlencode(sorted(request.query_params.lists()), doseq=True),
+            get_language() or '',
+            request.accepted_renderer.format,
+            model_versions(*self.response_cache_models),
+        ))
+        return f'api:response:{md5(raw.encode()).hexdigest()}'
+
+    @staticmethod
+    def _etag_matches(request, etag):
+        if_none_match = request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        return if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if (not self.response_cache_models or request.method not in ('GET', 'HEAD')
+                or request.accepted_renderer.format not in self.response_cache_formats):
+            return handler(request, *args, **kwargs)
+
+        key = self._response_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK or response.streaming:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            headers = {name: response[name] for name in self.response_cache_headers if response.has_header(name)}
+            entry = (f'"{md5(response.content).hexdigest()}"', response.content, response['Content-Type'], headers)
+            cache.set(key, entry, self.response_cache_timeout)
+
+        etag, content, content_type, headers = entry
+        if self._etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        for name, value in headers.items():
+            response[name] = value
+        response['ETag'] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
 
 class DetailResponse:
     """ Works only with UpdateMixin """
@@ -108,15 +257,7 @@ class MultipleDestroyMixin:
     def multiple_delete(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        queryset = self.get_queryset()
-        items = queryset.filter(id__in=serializer.data['ids'])
-        not_deleted_items = []
-        for item in items:
-            item_id = item.id
-            try:
-                item.delete()
-            except django.db.models.deletion.ProtectedError as e:
-                not_deleted_items.append(item_id)
+        not_deleted_items = bulk_delete(self.get_queryset(), serializer.data['ids'])
         return Response({
             'not_deleted_items': not_deleted_items
         }, status=status.HTTP_204_NO_CONTENT if len(not_deleted_items) == 0 else status.HTTP_423_LOCKED)
@@ -130,6 +271,8 @@ class MultipleDestroyMixin:
 
 class SuperModelViewSet(
     PermissionByAction,
+    RelatedByAction,
+    ResponseCache,
     PaginationBreaker,
     MultipleDestroyMixin,
     DestroyModelMixin,
@@ -140,6 +283,8 @@ class SuperModelViewSet(
 
 class UltraModelViewSet(
     PermissionByAction,
+    RelatedByAction,
+    ResponseCache,
     PaginationBreaker,
     MultipleDestroyMixin,
     SerializersByAction,
@@ -151,6 +296,8 @@ class UltraModelViewSet(
 
 class UltraReadOnlyModelViewSet(
     PermissionByAction,
+    RelatedByAction,
+    ResponseCache,
     PaginationBreaker,
     MultipleDestroyMixin,
     SerializersByAction,
@@ -162,6 +309,8 @@ class UltraReadOnlyModelViewSet(
 
 class UltraReadAndCreateModelViewSet(
     PermissionByAction,
+    RelatedByAction,
+    ResponseCache,
     PaginationBreaker,
     MultipleDestroyMixin,
     SerializersByAction,
@@ -1,4 +1,34 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from utils.constants import COUNT, ESTIMATED
+
+
+def estimate_count(queryset):
+    """ Row estimate of the planner on PostgreSQL, an exact count elsewhere. """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
 
 
 class LargeResultsSetPagination(PageNumberPagination):
@@ -13,3 +43,99 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_query_param = 'offset'
     max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(COUNT) == ESTIMATED:
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pagination on (ordering field, id).
+
+    Each page is a range scan that starts right after the last row of the previous page,
+    so deep pages cost as much as the first one and no COUNT is run.
+    """
+
+    page_size = 12
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_field = 'created_at'
+    invalid_cursor_message = _('Неверный курсор.')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def _position(self, item):
+        if isinstance(item, dict):
+            return item[self.ordering_field], item['id']
+        return getattr(item, self.ordering_field), item.id
+
+    def encode_cursor(self, position):
+        value, pk = position
+        raw = f'{value.isoformat()}|{pk}'
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            value, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+            value, pk = parse_datetime(value), int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.ordering_field}__lt': value})
+                | Q(**{self.ordering_field: value, 'id__lt': pk})
+            )
+        queryset = queryset.order_by(f'-{self.ordering_field}', '-id')
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self._position(self.page[-1])))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    ordering_field = 'created_at'
+
+
+class DateJoinedKeysetPagination(KeysetPagination):
+    ordering_field = 'date_joined'
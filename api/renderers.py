@@ -0,0 +1,51 @@
+import orjson
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    """
+    Types orjson doesn't handle natively. Datetimes are passed through as well,
+    so they are formatted exactly like the stdlib renderer does it.
+    """
+    if isinstance(obj, PhoneNumber):
+        return str(obj)
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement of JSONRenderer encoding with orjson.
+
+    The output is byte-identical to the compact output of JSONRenderer. Indented output
+    (``Accept: application/json; indent=4``) is still produced by the stdlib encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        # Same escaping as JSONRenderer, these are invalid in JavaScript string literals.
+        if b'\xe2\x80' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
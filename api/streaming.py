@@ -0,0 +1,99 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from api.renderers import ORJSONRenderer
+from utils.constants import CSV, NDJSON
+
+STREAM_CHUNK_SIZE = 500
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _flatten(data, prefix=''):
+    row = {}
+    for key, value in data.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            row.update(_flatten(value, f'{name}.'))
+        elif isinstance(value, (list, tuple)):
+            row[name] = json.dumps(value, ensure_ascii=False, default=str)
+        else:
+            row[name] = value
+    return row
+
+
+def serialize_rows(queryset, serialize):
+    """
+    Serializes a queryset one row at a time, fetching it in chunks through
+    a server-side cursor where the database supports it.
+    """
+    for instance in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield serialize(instance)
+
+
+def json_stream(rows):
+    renderer = ORJSONRenderer()
+    yield b'['
+    separator = b''
+    for row in rows:
+        yield separator + renderer.render(row)
+        separator = b','
+    yield b']'
+
+
+def ndjson_stream(rows):
+    renderer = ORJSONRenderer()
+    for row in rows:
+        yield renderer.render(row) + b'\n'
+
+
+def csv_stream(rows):
+    writer = csv.writer(_Echo())
+    header = None
+    for row in rows:
+        row = _flatten(row)
+        if header is None:
+            header = list(row)
+            yield writer.writerow(header)
+        yield writer.writerow([row.get(name) for name in header])
+
+
+async def async_stream(chunks):
+    """
+    Hands a sync stream to an ASGI server a batch of chunks at a time. Django would otherwise
+    read a sync iterator to the end before sending anything. The batches are pulled on the
+    thread of the sync views, which owns the database connection of the queryset.
+    """
+    chunks = iter(chunks)
+    next_batch = sync_to_async(lambda: list(islice(chunks, STREAM_CHUNK_SIZE)), thread_sensitive=True)
+    while True:
+        batch = await next_batch()
+        if not batch:
+            break
+        for chunk in batch:
+            yield chunk
+
+
+STREAMS = {
+    NDJSON: (ndjson_stream, 'application/x-ndjson'),
+    CSV: (csv_stream, 'text/csv; charset=utf-8'),
+}
+
+
+def streaming_response(request, rows, export=None, filename='export'):
+    stream, content_type = STREAMS.get(export, (json_stream, 'application/json'))
+    chunks = stream(rows)
+    if isinstance(request, ASGIRequest):
+        chunks = async_stream(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if export == CSV:
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
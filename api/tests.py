@@ -0,0 +1,104 @@
+import datetime
+
+import orjson
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from account.models import Client, Staff, User
+from bank.models import Branch, BranchSchedule, Queue, Record
+from core.models import City, Service
+
+
+class ListQueryBudgetTests(TestCase):
+    """ The number of queries of a list does not depend on its page size. """
+    rows = 12
+    page_sizes = (2, 10)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(phone='+996555000000', email='admin@example.com',
+                                                  password='secret')
+        for i in range(cls.rows):
+            city = City.objects.create(name=f'Город {i}')
+            service = Service.objects.create(name=f'Сервис {i}')
+            branch = Branch.objects.create(city=city, address=f'Адрес {i}', description='Описание')
+            for week, _ in BranchSchedule.DAYS:
+                BranchSchedule.objects.create(branch=branch, week=week, start_time=datetime.time(9),
+                                              end_time=datetime.time(18))
+            user = User.objects.create_user(phone=f'+99655500{i + 1:04d}', email=f'user{i}@example.com',
+                                            first_name='Имя', last_name='Фамилия')
+            Client.objects.create(user=user)
+            staff_user = User.objects.create_user(phone=f'+99677700{i + 1:04d}', email=f'staff{i}@example.com',
+                                                  role=User.STAFF)
+            Staff.objects.create(user=staff_user, branch=branch)
+            Record.objects.create(user=user, name='Клиент', branch=branch, service=service,
+                                  meeting_date=timezone.now() + datetime.timedelta(days=1, hours=i))
+            Queue.objects.issue(branch, service, user=user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, url, page_size):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'limit': page_size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), page_size)
+        return len(queries)
+
+    def assertQueriesDoNotGrow(self, url):
+        # Leaves out the one-off work of the first request of a session, such as the presence marker
+        self.client.get(url, {'limit': 1})
+        small, large = self.page_sizes
+        expected = self.count_queries(url, small)
+        with self.assertNumQueries(expected):
+            self.count_queries(url, large)
+
+    def test_cities(self):
+        self.assertQueriesDoNotGrow('/api/v1/cities/')
+
+    def test_services(self):
+        self.assertQueriesDoNotGrow('/api/v1/services/')
+
+    def test_branches(self):
+        self.assertQueriesDoNotGrow('/api/v1/bank/branches/')
+
+    def test_branch_schedules(self):
+        self.assertQueriesDoNotGrow('/api/v1/bank/branch-schedules/')
+
+    def test_records(self):
+        self.assertQueriesDoNotGrow('/api/v1/bank/records/')
+
+    def test_queues(self):
+        self.assertQueriesDoNotGrow('/api/v1/bank/queues/')
+
+    def test_users(self):
+        self.assertQueriesDoNotGrow('/api/v1/auth/users/')
+
+    def test_clients(self):
+        self.assertQueriesDoNotGrow('/api/v1/auth/clients/')
+
+    def test_staffs(self):
+        self.assertQueriesDoNotGrow('/api/v1/auth/staffs/')
+
+
+class StreamingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        City.objects.bulk_create(City(name=f'Город {i}') for i in range(3))
+
+    async def test_asgi_stream_is_asynchronous(self):
+        response = await AsyncClient().get('/api/v1/cities/', {'use_pagination': 'false', 'export': 'ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        rows = [orjson.loads(line) async for line in response.streaming_content]
+        self.assertEqual(sorted(row['name'] for row in rows), ['Город 0', 'Город 1', 'Город 2'])
+
+    def test_wsgi_stream_is_synchronous(self):
+        response = self.client.get('/api/v1/cities/', {'use_pagination': 'false', 'export': 'ndjson'})
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from bank.models import BranchSchedule, Branch, Record, RecordToStaff, Queue
+from bank.models import BranchSchedule, Branch, Record, RecordToStaff, Queue, QueueArchive, \
+    QueueCounter, ServiceTimeStat, BranchDailyStats
 
 
 class BranchScheduleStackedInline(admin.StackedInline):
@@ -40,11 +41,49 @@ class RecordToStaffAdmin(admin.ModelAdmin):
 class QueueAdmin(admin.ModelAdmin):
     list_display = ('id', 'slug', 'branch', 'created_at', 'status',)
     list_display_links = ('id', 'slug',)
-    list_filter = ('branch', 'service', 'status',)
+    list_filter = ('branch', 'service', 'status', 'business_date',)
     readonly_fields = ('created_at', 'updated_at',)
 
     @admin.display(description=_('номер'))
     def slug(self, obj: Queue):
         return obj.slug
 
+
+@admin.register(QueueArchive)
+class QueueArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'slug', 'branch', 'business_date', 'status',)
+    list_display_links = ('id', 'slug',)
+    list_filter = ('branch', 'service', 'status', 'business_date',)
+
+    @admin.display(description=_('номер'))
+    def slug(self, obj: QueueArchive):
+        return obj.slug
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(QueueCounter)
+class QueueCounterAdmin(admin.ModelAdmin):
+    list_display = ('id', 'branch', 'type', 'date', 'value',)
+    list_display_links = ('id', 'branch',)
+    list_filter = ('branch', 'type', 'date',)
+
+
+@admin.register(ServiceTimeStat)
+class ServiceTimeStatAdmin(admin.ModelAdmin):
+    list_display = ('id', 'branch', 'service', 'hour', 'average', 'count',)
+    list_display_links = ('id', 'branch',)
+    list_filter = ('branch', 'service', 'hour',)
+
+
+@admin.register(BranchDailyStats)
+class BranchDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('id', 'branch', 'service', 'date', 'issued', 'served', 'booked', 'checked_in',)
+    list_display_links = ('id', 'branch',)
+    list_filter = ('branch', 'service', 'date',)
+
 # Register your models here.
@@ -6,3 +6,6 @@ class BankConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bank'
     verbose_name = _('1. Электронная очередь')
+
+    def ready(self):
+        import bank.signals
@@ -0,0 +1,68 @@
+import datetime
+from bisect import bisect_right
+
+from django.conf import settings
+from django.utils import timezone
+
+from bank.models import Record
+from bank.schedules import schedule_index
+
+
+class SlotAvailability:
+    """
+    Free appointment slots of a branch for a service.
+
+    Slots of ``RECORD_SLOT_MINUTES`` are laid out over the opening hours of each day, in the time
+    zone of the branch, and the waiting records of the whole range are subtracted with one query,
+    served by the partial index of record_unique_waiting_slot. A record takes one slot length from
+    its start, so an off-grid record blocks every slot it overlaps. Nothing is cached, so a slot booked
+    through any worker is gone from the very next answer.
+    """
+
+    def __init__(self, branch_id, service_id):
+        self.branch_id = branch_id
+        self.service_id = service_id
+        self.step = datetime.timedelta(minutes=settings.RECORD_SLOT_MINUTES)
+        self.zone = schedule_index.get_timezone(branch_id)
+
+    def _aware(self, day, time):
+        return timezone.make_aware(datetime.datetime.combine(day, time), self.zone)
+
+    def _day_slots(self, day):
+        opening = schedule_index.get_day_slot(self.branch_id, day.weekday())
+        if opening is None:
+            return []
+        start, end = self._aware(day, opening[0]), self._aware(day, opening[1])
+        slots = []
+        while start + self.step <= end:
+            slots.append(start)
+            start += self.step
+        return slots
+
+    def booked(self, days):
+        """ Waiting records of the given consecutive days. """
+        start = self._aware(days[0], datetime.time.min)
+        end = self._aware(days[-1] + datetime.timedelta(days=1), datetime.time.min)
+        return Record.objects.filter(
+            branch_id=self.branch_id,
+            service_id=self.service_id,
+            status=Record.WAITING,
+            meeting_date__gte=start,
+            meeting_date__lt=end,
+        )
+
+    def _is_taken(self, slot, booked):
+        # The first record starting after slot - step overlaps the slot if it starts before its end
+        index = bisect_right(booked, slot - self.step)
+        return index < len(booked) and booked[index] < slot + self.step
+
+    def _compute(self, days):
+        booked = sorted(self.booked(days).values_list('meeting_date', flat=True))
+        return {day: [slot for slot in self._day_slots(day) if not self._is_taken(slot, booked)] for day in days}
+
+    def free_slots(self, start_date, days=7):
+        """ Maps each of ``days`` days from ``start_date`` to its free slot start times. """
+        dates = [start_date + datetime.timedelta(days=offset) for offset in range(days)]
+        result = self._compute(dates)
+        now = timezone.now()
+        return {day: [slot for slot in result[day] if slot > now] for day in dates}
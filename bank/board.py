@@ -0,0 +1,137 @@
+import asyncio
+import json
+import select
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+
+from bank.models import Queue
+
+CHANNEL = 'queue_board'
+SUBSCRIBER_BUFFER = 100
+EVENT_FIELDS = ('id', 'value', 'type', 'status', 'service', 'window')
+
+
+def queue_event(queue: Queue, event: str) -> dict:
+    return {
+        'event': event,
+        'id': queue.id,
+        'slug': queue.slug,
+        'value': queue.value,
+        'type': queue.type,
+        'status': queue.status,
+        'service': queue.service_id,
+        'window': queue.window,
+    }
+
+
+def snapshot(branch_id) -> list:
+    """ Today's open tickets of a branch, in the same compact shape as the events. """
+    queues = Queue.objects.today(branch_id).filter(
+        status__in=(Queue.WAITING, Queue.IN_PROGRESS),
+    ).order_by('created_at', 'id').values(*EVENT_FIELDS)
+    return [{'slug': Queue(type=row['type'], value=row['value']).slug, **row} for row in queues]
+
+
+class Subscription:
+
+    def __init__(self, board, branch_id):
+        self.board = board
+        self.branch_id = branch_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+
+    def put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # A screen that can't keep up is disconnected and has to resubscribe for a fresh snapshot.
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def close(self):
+        self.board.unsubscribe(self)
+
+
+class QueueBoard:
+    """
+    Fan-out of queue ticket events to the screens subscribed to a branch.
+
+    Every event is encoded once and the same payload is handed to all subscribers of the process.
+    On PostgreSQL events travel through NOTIFY, so tickets changed by any worker process reach
+    every ASGI process and are delivered only after the transaction commits. On other backends
+    events are delivered to subscribers of the current process only.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._listener = None
+
+    @staticmethod
+    def _uses_notify():
+        return connection.vendor == 'postgresql'
+
+    def publish(self, branch_id, event: dict):
+        payload = json.dumps(event, separators=(',', ':'))
+        if self._uses_notify():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, f'{branch_id}:{payload}'])
+        else:
+            transaction.on_commit(lambda: self.dispatch(branch_id, payload))
+
+    def publish_queue(self, queue: Queue, event: str):
+        self.publish(queue.branch_id, queue_event(queue, event))
+
+    def dispatch(self, branch_id, payload):
+        with self._lock:
+            subscribers = tuple(self._subscribers.get(int(branch_id), ()))
+        for subscriber in subscribers:
+            subscriber.loop.call_soon_threadsafe(subscriber.put, payload)
+
+    def subscribe(self, branch_id) -> Subscription:
+        subscription = Subscription(self, int(branch_id))
+        with self._lock:
+            self._subscribers[subscription.branch_id].add(subscription)
+        if self._uses_notify():
+            self._ensure_listener()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.branch_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.branch_id]
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='queue-board-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        raw = connection.get_new_connection(connection.get_connection_params())
+        raw.autocommit = True
+        with raw.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        try:
+            while True:
+                if select.select([raw], [], [], 60) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    branch_id, payload = notify.payload.split(':', 1)
+                    self.dispatch(branch_id, payload)
+        finally:
+            raw.close()
+
+
+board = QueueBoard()
@@ -0,0 +1,99 @@
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+
+from bank import stats
+from bank.codes import generate_code
+from bank.models import Branch, Record
+from bank.schedules import schedule_index
+from core.models import Service
+
+
+def booking_errors(branch_id, meeting_date, taken):
+    """
+    Errors of a new booking, None when it can be made. Single and bulk bookings share them:
+    the branch has to be open at the meeting time, in its own time zone, and the slot free.
+    """
+    if not schedule_index.is_open(branch_id, meeting_date):
+        return {'branch': [_('Отделение закрыто')]}
+    if taken:
+        return {'branch': [_(f'{meeting_date.date()} в {meeting_date.time()} в отделение уже есть запись')]}
+    return None
+
+
+class RecordBulkImporter:
+    """
+    Validates a batch of bookings with a few set-based queries and inserts the valid ones
+    with a single bulk_create. Items are (index, data) pairs, data being a dict with name,
+    branch, service and meeting_date already validated field by field.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def _load(self, items):
+        branch_ids = {item['branch'] for _, item in items}
+        service_ids = {item['service'] for _, item in items}
+        branches = Branch.objects.select_related('city').in_bulk(branch_ids)
+        services = Service.objects.in_bulk(service_ids)
+        booked = set(Record.objects.filter(
+            status=Record.WAITING,
+            branch_id__in=branch_ids,
+            service_id__in=service_ids,
+            meeting_date__in={item['meeting_date'] for _, item in items},
+        ).values_list('branch_id', 'service_id', 'meeting_date'))
+        return branches, services, booked
+
+    @staticmethod
+    def _validate(item, branches, services, booked):
+        branch_id, service_id, meeting_date = item['branch'], item['service'], item['meeting_date']
+        if branch_id not in branches:
+            return {'branch': [_('Отделение не найдено')]}
+        if service_id not in services:
+            return {'service': [_('Сервис не найден')]}
+        return booking_errors(branch_id, meeting_date, (branch_id, service_id, meeting_date) in booked)
+
+    @staticmethod
+    def _make_codes_unique(records):
+        taken = set(Record.objects.filter(code__in=[record.code for record in records])
+                    .values_list('code', flat=True))
+        for record in records:
+            while record.code in taken:
+                record.code = generate_code()
+            taken.add(record.code)
+
+    def run(self, items):
+        """ Returns the created records and a list of {'index', 'errors'} for the rejected items. """
+        branches, services, booked = self._load(items)
+        pending, errors = [], []
+        for index, item in items:
+            item_errors = self._validate(item, branches, services, booked)
+            if item_errors:
+                errors.append({'index': index, 'errors': item_errors})
+                continue
+            booked.add((item['branch'], item['service'], item['meeting_date']))
+            pending.append((index, Record(
+                user=self.user,
+                name=item['name'],
+                branch=branches[item['branch']],
+                service=services[item['service']],
+                meeting_date=item['meeting_date'],
+            )))
+
+        records = [record for _, record in pending]
+        self._make_codes_unique(records)
+        try:
+            with transaction.atomic():
+                Record.objects.bulk_create(records)
+                stats.records_created(records)
+        except IntegrityError:
+            # A concurrent booking took one of the slots, insert one by one to find it
+            records = []
+            for index, record in pending:
+                try:
+                    with transaction.atomic():
+                        record.save()
+                except IntegrityError:
+                    errors.append({'index': index, 'errors': {'branch': [_('Время уже занято')]}})
+                else:
+                    records.append(record)
+        return records, errors
@@ -0,0 +1,34 @@
+import hashlib
+import hmac
+import secrets
+import string
+
+from django.conf import settings
+
+BODY_LENGTH = 9
+CHECK_LENGTH = 3
+CODE_LENGTH = BODY_LENGTH + CHECK_LENGTH
+LEGACY_CODE_LENGTH = 10
+
+
+def _check_digits(body):
+    digest = hmac.new(settings.SECRET_KEY.encode(), f'record-code:{body}'.encode(), hashlib.sha256).digest()
+    return str(int.from_bytes(digest[:8], 'big') % 10 ** CHECK_LENGTH).zfill(CHECK_LENGTH)
+
+
+def generate_code():
+    """ Random digits followed by HMAC check digits, so kiosks can verify a code offline. """
+    body = ''.join(secrets.choice(string.digits) for _ in range(BODY_LENGTH))
+    return body + _check_digits(body)
+
+
+def is_valid_code(code):
+    """ Rejects mistyped and forged codes without a database lookup. """
+    if not code.isdigit():
+        return False
+    if len(code) == LEGACY_CODE_LENGTH:
+        # Codes issued before check digits existed can only be checked against the database
+        return True
+    if len(code) != CODE_LENGTH:
+        return False
+    return hmac.compare_digest(code[BODY_LENGTH:], _check_digits(code[:BODY_LENGTH]))
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from bank.models import Branch, QueueArchive
+
+
+class Command(BaseCommand):
+    help = 'Moves queue tickets of closed business days to the archive table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tickets moved per transaction')
+        parser.add_argument('--keep-days', type=int, default=0, help='Closed business days to keep live')
+
+    def handle(self, *args, batch_size, keep_days, **options):
+        total = 0
+        for branch in Branch.objects.only('id', 'timezone').order_by('id'):
+            before = branch.local_date() - timedelta(days=keep_days)
+            moved = QueueArchive.objects.archive(branch.pk, before, batch_size)
+            if moved:
+                self.stdout.write(f'{branch.pk}: {moved} tickets before {before}')
+            total += moved
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} tickets'))
@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bank import stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily branch statistics from tickets, archived tickets and bookings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='First business day to rebuild, YYYY-MM-DD. All days by default')
+        parser.add_argument('--branch', type=int, help='Rebuild a single branch')
+
+    def handle(self, *args, since, branch, **options):
+        if since is not None:
+            try:
+                since = date.fromisoformat(since)
+            except ValueError:
+                raise CommandError(f'Invalid date: {since}')
+        written = stats.rebuild(since=since, branch_id=branch)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily statistics rows'))
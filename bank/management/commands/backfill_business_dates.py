@@ -0,0 +1,22 @@
+from zoneinfo import ZoneInfo
+
+from django.core.management.base import BaseCommand
+from django.db.models.functions import TruncDate
+
+from bank.models import Branch, Queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Sets the business day of tickets issued before Queue.business_date existed, from their '
+        'creation time in the time zone of their branch. Run it after adding the column as nullable '
+        'and before making it NOT NULL.'
+    )
+
+    def handle(self, *args, **options):
+        total = 0
+        for branch in Branch.objects.only('id', 'timezone').order_by('id'):
+            total += Queue.objects.filter(branch=branch, business_date__isnull=True).update(
+                business_date=TruncDate('created_at', tzinfo=ZoneInfo(branch.timezone)),
+            )
+        self.stdout.write(self.style.SUCCESS(f'Set the business day of {total} tickets'))
@@ -0,0 +1,99 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from account.models import User
+from account.tokens import issue_token
+from bank.models import Branch, Queue
+from core.models import City, Service
+
+SYNC_URLS = {
+    'create': '/api/v1/bank/queues/',
+    'claim': '/api/v1/bank/next-queue/',
+    'complete': '/api/v1/bank/complete-queue/{}/',
+}
+ASYNC_URLS = {
+    'create': '/api/v1/bank/async/queues/',
+    'claim': '/api/v1/bank/async/next-queue/',
+    'complete': '/api/v1/bank/async/complete-queue/{}/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the sync queue views served through WSGI with their async variants served through ASGI '
+        'on issue, call and complete cycles. Writes to the database, run it against a development one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cycles', type=int, default=200, help='Issue, call and complete cycles per variant')
+        parser.add_argument('--concurrency', type=int, default=10, help='Cycles in flight at once')
+
+    def _split(self, cycles, concurrency):
+        return [cycles // concurrency + (index < cycles % concurrency) for index in range(concurrency)]
+
+    def _run_sync(self, urls, headers, body, branch_id, cycles, concurrency):
+        def worker(count):
+            client = Client(headers=headers)
+            try:
+                for _ in range(count):
+                    client.post(urls['create'], body, content_type='application/json')
+                    response = client.get(urls['claim'], {'branch': branch_id})
+                    if response.status_code == 200:
+                        client.get(urls['complete'].format(response.json()['id']))
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(worker, self._split(cycles, concurrency)))
+
+    async def _run_async(self, urls, headers, body, branch_id, cycles, concurrency):
+        async def worker(count):
+            # Headers are passed per request, AsyncClient(headers=...) ignores them on Django 4.2
+            client = AsyncClient()
+            for _ in range(count):
+                await client.post(urls['create'], body, content_type='application/json', headers=headers)
+                response = await client.get(urls['claim'], {'branch': branch_id}, headers=headers)
+                if response.status_code == 200:
+                    await client.get(urls['complete'].format(response.json()['id']), headers=headers)
+
+        await asyncio.gather(*(worker(count) for count in self._split(cycles, concurrency)))
+
+    def handle(self, *args, cycles, concurrency, **options):
+        city = City.objects.first()
+        service = Service.objects.first()
+        if city is None or service is None:
+            raise CommandError('A city and a service are required to create the benchmark branch.')
+
+        setup_test_environment()
+        branch = Branch.objects.create(city=city, address='benchmark', description='benchmark')
+        user = User.objects.create_user(phone='+99650' + str(uuid.uuid4().int)[:7],
+                                        email=f'{uuid.uuid4().hex}@example.com')
+        headers = {'Authorization': f'Token {issue_token(user).key}'}
+        body = {'branch': branch.id, 'service': service.id}
+        try:
+            for name, urls in (('wsgi', SYNC_URLS), ('asgi', ASYNC_URLS)):
+                started = time.perf_counter()
+                if name == 'wsgi':
+                    self._run_sync(urls, headers, body, branch.id, cycles, concurrency)
+                else:
+                    asyncio.run(self._run_async(urls, headers, body, branch.id, cycles, concurrency))
+                elapsed = time.perf_counter() - started
+                issued = Queue.objects.filter(branch=branch).count()
+                completed = Queue.objects.filter(branch=branch, status=Queue.COMPLETED).count()
+                self.stdout.write(
+                    f'{name}: {cycles} cycles in {elapsed:.2f}s, {cycles / elapsed:.1f} cycles/s, '
+                    f'issued {issued}, completed {completed}'
+                )
+                Queue.objects.filter(branch=branch).delete()
+        finally:
+            Queue.objects.filter(branch=branch).delete()
+            branch.delete()
+            user.delete()
+            teardown_test_environment()
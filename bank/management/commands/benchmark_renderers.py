@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.bank.serializers import QueueSerializer, ReadRecordSerializer
+from api.renderers import ORJSONRenderer
+from bank.models import Queue, Record
+
+RELATED = ('user', 'branch__city', 'service')
+
+
+class Command(BaseCommand):
+    help = 'Compares JSONRenderer and ORJSONRenderer on record and queue list payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000, help='Rows per payload')
+        parser.add_argument('--repeat', type=int, default=20, help='Renders per renderer')
+
+    def _payload(self, queryset, serializer_class, size):
+        rows = serializer_class(queryset.select_related(*RELATED)[:size], many=True).data
+        if not rows:
+            return None
+        # Small databases are padded by repeating rows, the payload shape is what matters.
+        return (rows * (size // len(rows) + 1))[:size]
+
+    def _measure(self, renderer, data, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            content = renderer.render(data)
+        return time.perf_counter() - started, content
+
+    def handle(self, *args, size, repeat, **options):
+        payloads = {
+            'records': self._payload(Record.objects.order_by('-created_at'), ReadRecordSerializer, size),
+            'queues': self._payload(Queue.objects.order_by('-created_at'), QueueSerializer, size),
+        }
+        if not any(payloads.values()):
+            raise CommandError('There are no records or queues to render.')
+
+        for name, data in payloads.items():
+            if data is None:
+                self.stdout.write(f'{name}: no rows, skipped')
+                continue
+            stdlib, expected = self._measure(JSONRenderer(), data, repeat)
+            fast, content = self._measure(ORJSONRenderer(), data, repeat)
+            self.stdout.write(
+                f'{name}: {len(data)} rows, {len(content)} bytes, '
+                f'json {repeat / stdlib:.1f}/s, orjson {repeat / fast:.1f}/s, '
+                f'x{stdlib / fast:.1f}, identical: {content == expected}'
+            )
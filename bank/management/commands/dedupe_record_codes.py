@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from bank.codes import generate_code
+from bank.models import Record
+
+
+class Command(BaseCommand):
+    help = (
+        'Gives new codes to records that share a check-in code. Run it on databases created before '
+        'Record.code became unique, before the unique index is added.'
+    )
+
+    def handle(self, *args, **options):
+        duplicated = list(
+            Record.objects.values('code').annotate(count=Count('id')).filter(count__gt=1).values_list('code', flat=True)
+        )
+        # A waiting booking keeps its code, as its client may still check in with it
+        waiting_first = Case(When(status=Record.WAITING, then=Value(0)), default=Value(1), output_field=IntegerField())
+        changed = 0
+        for code in duplicated:
+            with transaction.atomic():
+                records = list(Record.objects.select_for_update().filter(code=code).order_by(waiting_first, 'id'))
+                for record in records[1:]:
+                    new_code = generate_code()
+                    while Record.objects.filter(code=new_code).exists():
+                        new_code = generate_code()
+                    Record.objects.filter(pk=record.pk).update(code=new_code)
+                    self.stdout.write(f'{record.pk}: {code} -> {new_code}')
+                    changed += 1
+        self.stdout.write(self.style.SUCCESS(f'Gave new codes to {changed} records'))
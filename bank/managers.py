@@ -0,0 +1,233 @@
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F, Q, Sum, Value
+from django.utils import timezone
+
+
+class BranchQuerySet(models.QuerySet):
+
+    def with_is_open(self, moment=None):
+        from bank.schedules import open_now_expression
+
+        return self.annotate(is_open_now=open_now_expression(moment))
+
+
+class QueueCounterManager(models.Manager):
+
+    def next_value(self, branch, type, date=None):
+        """
+        Atomically allocates the next ticket number for a branch, ticket type and business day.
+        Locks a single counter row, so the cost does not depend on how many tickets were issued.
+        """
+        date = date or branch.local_date()
+        with transaction.atomic(using=self.db):
+            counter, _ = self.select_for_update().get_or_create(branch=branch, type=type, date=date)
+            self.filter(pk=counter.pk).update(value=F('value') + 1)
+            counter.refresh_from_db(fields=('value',))
+        return counter.value
+
+
+class QueueManager(models.Manager):
+
+    def on_day(self, branch_id, business_date):
+        return self.filter(branch_id=branch_id, business_date=business_date)
+
+    def today(self, branch):
+        """ Tickets of the current business day of a branch, given as an instance or an id. """
+        if not isinstance(branch, models.Model):
+            branch = self.model._meta.get_field('branch').related_model.objects.only('timezone').get(pk=branch)
+        return self.on_day(branch.pk, branch.local_date())
+
+    def issue(self, branch, service, type=None, user=None):
+        """ Creates a ticket with the next number of the branch's business day. """
+        from bank.models import QueueCounter
+
+        type = type or self.model.SIMPLE
+        business_date = branch.local_date()
+        with transaction.atomic(using=self.db):
+            return self.create(
+                branch=branch,
+                service=service,
+                type=type,
+                user=user,
+                business_date=business_date,
+                value=QueueCounter.objects.next_value(branch=branch, type=type, date=business_date),
+            )
+
+    def check_in(self, code):
+        """ Turns the waiting booking with ``code`` into a ticket, returns None if there is no such booking. """
+        from bank.models import Record
+
+        with transaction.atomic(using=self.db):
+            record = Record.objects.select_for_update().filter(code=code, status=Record.WAITING).first()
+            if record is None:
+                return None
+            queue = self.issue(record.branch, record.service, self.model.RECORDED_CLIENT, record.user)
+            record.status = Record.COMPLETED
+            record.save()
+        return queue
+
+    def _waiting(self, branch, service=None):
+        queryset = self.today(branch).filter(status=self.model.WAITING)
+        if service is not None:
+            queryset = queryset.filter(service=service)
+        return queryset.order_by('created_at', 'id')
+
+    def _transition(self, pk, from_status, to_status, **fields):
+        return self.filter(pk=pk, status=from_status).update(
+            status=to_status, updated_at=timezone.now(), **fields
+        )
+
+    def claim_next(self, branch, service=None, window=None):
+        """
+        Moves the oldest waiting ticket of the day to IN_PROGRESS and returns it, or None.
+        Every caller gets a different ticket: on databases that support it the candidate row
+        is taken with SELECT ... FOR UPDATE SKIP LOCKED, elsewhere the conditional UPDATE
+        decides the winner and the loser retries with the next candidate.
+        """
+        queryset = self._waiting(branch, service)
+        if connections[self.db].features.has_select_for_update_skip_locked:
+            with transaction.atomic(using=self.db):
+                pk = queryset.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+                if pk is None:
+                    return None
+                self._transition(pk, self.model.WAITING, self.model.IN_PROGRESS,
+                                 window=window, started_at=timezone.now())
+            return self._claimed(pk)
+
+        while True:
+            pk = queryset.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            if self._transition(pk, self.model.WAITING, self.model.IN_PROGRESS,
+                                window=window, started_at=timezone.now()):
+                return self._claimed(pk)
+
+    def _claimed(self, pk):
+        from bank import stats
+        from bank.models import BranchDailyHistogram
+
+        queue = self.get(pk=pk)
+        transaction.on_commit(lambda: stats.observe(
+            queue.branch_id, queue.service_id, queue.business_date, BranchDailyHistogram.WAIT,
+            (queue.started_at - queue.created_at).total_seconds(),
+        ), using=self.db)
+        return queue
+
+    def complete(self, pk):
+        """
+        Moves an IN_PROGRESS ticket to COMPLETED, returns False if it was not in progress.
+        The time the ticket was served is added to the service time statistics once the change
+        is committed: their rows are shared by every window of the branch, so their locks are
+        not held for the rest of the caller's transaction.
+        """
+        completed_at = timezone.now()
+        with transaction.atomic(using=self.db):
+            if not self._transition(pk, self.model.IN_PROGRESS, self.model.COMPLETED, completed_at=completed_at):
+                return False
+            ticket = self.filter(pk=pk).values('branch_id', 'service_id', 'business_date', 'started_at').get()
+            transaction.on_commit(lambda: self._count_served(ticket, completed_at), using=self.db)
+        return True
+
+    @staticmethod
+    def _count_served(ticket, completed_at):
+        from bank import stats
+        from bank.models import BranchDailyHistogram, ServiceTimeStat
+        from bank.schedules import schedule_index
+
+        if ticket['started_at'] is None:
+            stats.count(ticket['branch_id'], ticket['service_id'], ticket['business_date'], served=1)
+            return
+        duration = (completed_at - ticket['started_at']).total_seconds()
+        hour = schedule_index.localtime(ticket['branch_id'], ticket['started_at']).hour
+        ServiceTimeStat.objects.record(ticket['branch_id'], ticket['service_id'], hour, duration)
+        stats.observe(ticket['branch_id'], ticket['service_id'], ticket['business_date'],
+                      BranchDailyHistogram.SERVICE, duration)
+
+    def people_ahead(self, queue):
+        """ Waiting tickets of the branch and service that will be called before ``queue``. """
+        if queue.status != self.model.WAITING:
+            return 0
+        return self.on_day(queue.branch_id, queue.business_date).filter(
+            Q(created_at__lt=queue.created_at) | Q(created_at=queue.created_at, id__lt=queue.id),
+            service_id=queue.service_id,
+            status=self.model.WAITING,
+        ).count()
+
+    def estimate_wait(self, queue, moment=None):
+        """
+        People ahead of a waiting ticket and the estimated wait in seconds.
+        The people ahead are served by as many windows as there are tickets of the service in
+        progress, each taking the average time of the service at the branch at this hour.
+        """
+        from bank.models import ServiceTimeStat
+        from bank.schedules import schedule_index
+
+        ahead = self.people_ahead(queue)
+        if not ahead:
+            return 0, 0
+        windows = self.on_day(queue.branch_id, queue.business_date).filter(
+            service_id=queue.service_id, status=self.model.IN_PROGRESS,
+        ).count()
+        hour = schedule_index.localtime(queue.branch_id, moment).hour
+        average = ServiceTimeStat.objects.average(queue.branch_id, hour, queue.service_id)
+        return ahead, round(ahead * average / max(windows, 1))
+
+
+class ServiceTimeStatManager(models.Manager):
+
+    def record(self, branch_id, service_id, hour, duration):
+        """
+        Folds one service time into the moving average of a branch, service and hour.
+        Each completion is a single UPDATE of one row, older samples fade out exponentially.
+        """
+        alpha = settings.QUEUE_SERVICE_TIME_ALPHA
+        stats = self.filter(branch_id=branch_id, service_id=service_id, hour=hour)
+        updated = stats.update(average=F('average') + alpha * (Value(duration) - F('average')), count=F('count') + 1)
+        if updated:
+            return
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(branch_id=branch_id, service_id=service_id, hour=hour, average=duration, count=1)
+        except IntegrityError:
+            stats.update(average=F('average') + alpha * (Value(duration) - F('average')), count=F('count') + 1)
+
+    def average(self, branch_id, hour, service_id=None):
+        """
+        Average service time of a branch in seconds, of ``service_id`` when it is given: at this
+        hour, over the whole day when the hour has no history yet, then the same over all the
+        services of the branch, otherwise the configured default.
+        """
+        stats = self.filter(branch_id=branch_id)
+        querysets = [stats.filter(hour=hour), stats]
+        if service_id is not None:
+            service_stats = stats.filter(service_id=service_id)
+            querysets = [service_stats.filter(hour=hour), service_stats, *querysets]
+        for queryset in querysets:
+            totals = queryset.aggregate(weighted=Sum(F('average') * F('count')), count=Sum('count'))
+            if totals['count']:
+                return totals['weighted'] / totals['count']
+        return settings.QUEUE_DEFAULT_SERVICE_SECONDS
+
+
+class QueueArchiveManager(models.Manager):
+
+    def archive(self, branch_id, before, batch_size=1000):
+        """
+        Moves the tickets of a branch from business days before ``before`` into the archive.
+        Every batch is copied with one INSERT and removed with one DELETE in the same transaction,
+        so a ticket is never lost or live in both tables. Returns the number of moved tickets.
+        """
+        from bank.models import Queue
+
+        fields = [field.attname for field in self.model._meta.concrete_fields]
+        queryset = Queue.objects.filter(branch_id=branch_id, business_date__lt=before).order_by('id')
+        moved = 0
+        while True:
+            with transaction.atomic(using=self.db):
+                rows = list(queryset.values(*fields)[:batch_size])
+                if not rows:
+                    return moved
+                self.bulk_create([self.model(**row) for row in rows], ignore_conflicts=True)
+                Queue.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            moved += len(rows)
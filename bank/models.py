@@ -1,12 +1,15 @@
-import random
-import string
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.utils import timezone
+from django.db import IntegrityError, models, transaction
+from django.utils.timezone import localtime
 from django.utils.translation import gettext_lazy as _
 
 from utils.models import TimeStampAbstractModel
+from .codes import CODE_LENGTH, generate_code
+from .managers import BranchQuerySet, QueueArchiveManager, QueueCounterManager, QueueManager, ServiceTimeStatManager
+from .schedules import schedule_index
 
 
 class BranchSchedule(TimeStampAbstractModel):
@@ -42,6 +45,17 @@ class BranchSchedule(TimeStampAbstractModel):
         return f'{self.branch} - {self.week}'
 
 
+def branch_timezone():
+    return settings.TIME_ZONE
+
+
+def validate_timezone(value):
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(_('Неизвестный часовой пояс'))
+
+
 class Branch(TimeStampAbstractModel):
     class Meta:
         verbose_name = _('отделение')
@@ -51,28 +65,31 @@ class Branch(TimeStampAbstractModel):
     city = models.ForeignKey('core.City', models.PROTECT, verbose_name=_('город'))
     address = models.CharField(_('адрес'), max_length=100)
     description = models.TextField(_('описание'))
+    timezone = models.CharField(_('часовой пояс'), max_length=63, default=branch_timezone,
+                                validators=[validate_timezone])
+
+    objects = BranchQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.city} - {self.address}'
 
+    def local_date(self, moment=None):
+        """ The business day of the branch at ``moment``, now by default. """
+        return localtime(moment, ZoneInfo(self.timezone)).date()
+
     @property
     def is_open(self):
-        day = timezone.localdate().weekday()
-        week = BranchSchedule.DAYS[day][0]
-        time = timezone.localtime().time()
-        schedule = self.schedules.filter(week=week)
+        annotated = self.__dict__.get('is_open_now')
+        if annotated is not None:
+            return annotated
+        return schedule_index.is_open(self.pk)
+
 
-        if schedule.exists():
-            schedule = schedule.first()
-            if schedule.start_time <= time <= schedule.end_time:
-                return True
-        return False
+CODE_ATTEMPTS = 5
 
 
 def code_generator():
-    chars = string.digits
-    code = ''.join(random.choice(chars) for _ in range(10))
-    return code
+    return generate_code()
 
 
 class Record(TimeStampAbstractModel):
@@ -90,21 +107,45 @@ class Record(TimeStampAbstractModel):
         verbose_name = _('запись')
         verbose_name_plural = _('записи')
         ordering = ('-created_at', '-updated_at')
+        constraints = (
+            # Also serves as the partial index for slot lookups of waiting records
+            models.UniqueConstraint(fields=('branch', 'service', 'meeting_date'),
+                                    condition=models.Q(status='waiting'), name='record_unique_waiting_slot'),
+        )
 
     user = models.ForeignKey('account.User', models.SET_NULL, null=True, verbose_name=_('пользователь'))
     name = models.CharField(_('Имя и фамилия'), max_length=100)
     branch = models.ForeignKey('bank.Branch', models.PROTECT, verbose_name=_('отделение'))
     service = models.ForeignKey('core.Service', models.PROTECT, verbose_name=_('сервис'))
     meeting_date = models.DateTimeField(_('дата и время прихода'))
-    code = models.CharField(_('код'), max_length=10, default=code_generator)
+    code = models.CharField(_('код'), max_length=CODE_LENGTH, unique=True, default=code_generator)
     status = models.CharField(_('статус'), max_length=20, default=WAITING, choices=STATUS)
 
     def __str__(self):
         return f'{self.user} - {self.branch}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        record = super().from_db(db, field_names, values)
+        # Lets the statistics tell status transitions from other updates
+        record.saved_status = record.__dict__.get('status')
+        return record
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            for attempt in range(CODE_ATTEMPTS - 1):
+                try:
+                    with transaction.atomic(using=kwargs.get('using')):
+                        return super().save(*args, **kwargs)
+                except IntegrityError:
+                    if not Record.objects.filter(code=self.code).exists():
+                        raise
+                    self.code = generate_code()
+        return super().save(*args, **kwargs)
+
     def clean(self):
 
-        if not self.branch.is_open and self.id is None:
+        if self.id is None and not schedule_index.is_open(self.branch_id, self.meeting_date):
             raise ValidationError({'branch': [_('Отделение закрыто')]})
         if self.id is not None:
             record = Record.objects.exclude(id=self.id).filter(
@@ -173,6 +214,9 @@ class Queue(TimeStampAbstractModel):
         verbose_name = _('очередь')
         verbose_name_plural = _('очереди')
         ordering = ('-created_at', '-updated_at')
+        indexes = (
+            models.Index(fields=('branch', 'business_date', 'status', 'created_at'), name='queue_branch_day_idx'),
+        )
 
     branch = models.ForeignKey('bank.Branch', models.PROTECT, verbose_name=_('отделение'))
     service = models.ForeignKey('core.Service', models.PROTECT, verbose_name=_('сервис'))
@@ -180,6 +224,12 @@ class Queue(TimeStampAbstractModel):
     type = models.CharField(_('тип'), choices=TYPE, default=SIMPLE, max_length=20)
     status = models.CharField(_('статус'), choices=STATUS, default=WAITING, max_length=20)
     user = models.ForeignKey('account.User', models.SET_NULL, null=True, blank=True, verbose_name=_('пользователь'))
+    window = models.PositiveSmallIntegerField(_('окно'), null=True, blank=True)
+    started_at = models.DateTimeField(_('начало обслуживания'), null=True, blank=True)
+    completed_at = models.DateTimeField(_('конец обслуживания'), null=True, blank=True)
+    business_date = models.DateField(_('рабочий день'))
+
+    objects = QueueManager()
 
     @property
     def slug(self):
@@ -189,4 +239,150 @@ class Queue(TimeStampAbstractModel):
     def __str__(self):
         return f'{self.slug} - {self.created_at}'
 
+    def save(self, *args, **kwargs):
+        if self.business_date is None:
+            self.business_date = self.branch.local_date()
+        super().save(*args, **kwargs)
+
+
+class QueueArchive(models.Model):
+    """ Tickets of closed business days, moved out of Queue by the archive_queues command. """
+
+    class Meta:
+        verbose_name = _('архивная очередь')
+        verbose_name_plural = _('архив очередей')
+        ordering = ('-created_at',)
+        indexes = (
+            models.Index(fields=('branch', 'business_date'), name='queue_archive_branch_day_idx'),
+        )
+
+    id = models.BigIntegerField(primary_key=True)
+    branch = models.ForeignKey('bank.Branch', models.PROTECT, related_name='+', verbose_name=_('отделение'))
+    service = models.ForeignKey('core.Service', models.PROTECT, related_name='+', verbose_name=_('сервис'))
+    value = models.PositiveIntegerField(_('место'))
+    type = models.CharField(_('тип'), choices=Queue.TYPE, max_length=20)
+    status = models.CharField(_('статус'), choices=Queue.STATUS, max_length=20)
+    user = models.ForeignKey('account.User', models.SET_NULL, null=True, blank=True, related_name='+',
+                             verbose_name=_('пользователь'))
+    window = models.PositiveSmallIntegerField(_('окно'), null=True, blank=True)
+    started_at = models.DateTimeField(_('начало обслуживания'), null=True, blank=True)
+    completed_at = models.DateTimeField(_('конец обслуживания'), null=True, blank=True)
+    business_date = models.DateField(_('рабочий день'))
+    created_at = models.DateTimeField(_('дата добавления'))
+    updated_at = models.DateTimeField(_('дата изменения'))
+
+    objects = QueueArchiveManager()
+
+    @property
+    def slug(self):
+        prefix = 'S' if self.type == Queue.SIMPLE else 'R'
+        return f'{prefix}{self.value}'
+
+    def __str__(self):
+        return f'{self.slug} - {self.created_at}'
+
+
+class QueueCounter(models.Model):
+    class Meta:
+        verbose_name = _('счётчик очереди')
+        verbose_name_plural = _('счётчики очереди')
+        constraints = (
+            models.UniqueConstraint(fields=('branch', 'type', 'date'), name='unique_queue_counter'),
+        )
+
+    branch = models.ForeignKey('bank.Branch', models.CASCADE, related_name='queue_counters',
+                               verbose_name=_('отделение'))
+    type = models.CharField(_('тип'), choices=Queue.TYPE, max_length=20)
+    date = models.DateField(_('рабочий день'))
+    value = models.PositiveIntegerField(_('последний номер'), default=0)
+
+    objects = QueueCounterManager()
+
+    def __str__(self):
+        return f'{self.branch} - {self.type} - {self.date}: {self.value}'
+
+
+class ServiceTimeStat(models.Model):
+    class Meta:
+        verbose_name = _('время обслуживания')
+        verbose_name_plural = _('время обслуживания')
+        constraints = (
+            models.UniqueConstraint(fields=('branch', 'service', 'hour'), name='unique_service_time_stat'),
+        )
+
+    branch = models.ForeignKey('bank.Branch', models.CASCADE, related_name='service_time_stats',
+                               verbose_name=_('отделение'))
+    service = models.ForeignKey('core.Service', models.CASCADE, verbose_name=_('сервис'))
+    hour = models.PositiveSmallIntegerField(_('час'))
+    average = models.FloatField(_('среднее время, сек'))
+    count = models.PositiveIntegerField(_('обслужено'), default=0)
+
+    objects = ServiceTimeStatManager()
+
+    def __str__(self):
+        return f'{self.branch} - {self.service} - {self.hour}: {round(self.average)}'
+
+
+class BranchDailyStats(models.Model):
+    """ Counters of a branch, service and business day, kept up to date by bank.stats. """
+
+    class Meta:
+        verbose_name = _('статистика за день')
+        verbose_name_plural = _('статистика по дням')
+        ordering = ('-date',)
+        constraints = (
+            models.UniqueConstraint(fields=('branch', 'service', 'date'), name='unique_branch_daily_stats'),
+        )
+        indexes = (
+            models.Index(fields=('branch', 'date'), name='branch_daily_stats_date_idx'),
+        )
+
+    branch = models.ForeignKey('bank.Branch', models.CASCADE, related_name='daily_stats',
+                               verbose_name=_('отделение'))
+    service = models.ForeignKey('core.Service', models.CASCADE, related_name='+', verbose_name=_('сервис'))
+    date = models.DateField(_('рабочий день'))
+    issued = models.PositiveIntegerField(_('выдано талонов'), default=0)
+    waited = models.PositiveIntegerField(_('вызвано'), default=0)
+    wait_seconds = models.FloatField(_('суммарное ожидание, сек'), default=0)
+    served = models.PositiveIntegerField(_('обслужено'), default=0)
+    service_seconds = models.FloatField(_('суммарное обслуживание, сек'), default=0)
+    booked = models.PositiveIntegerField(_('записей'), default=0)
+    checked_in = models.PositiveIntegerField(_('пришли по записи'), default=0)
+    canceled = models.PositiveIntegerField(_('отменено записей'), default=0)
+
+    def __str__(self):
+        return f'{self.branch} - {self.service} - {self.date}'
+
+
+class BranchDailyHistogram(models.Model):
+    """ Wait and service times of a branch, service and business day, counted per duration bucket. """
+    WAIT = 'wait'
+    SERVICE = 'service'
+
+    KIND = (
+        (WAIT, _('ожидание')),
+        (SERVICE, _('обслуживание')),
+    )
+
+    class Meta:
+        verbose_name = _('распределение времени за день')
+        verbose_name_plural = _('распределения времени по дням')
+        constraints = (
+            models.UniqueConstraint(fields=('branch', 'service', 'date', 'kind', 'bucket'),
+                                    name='unique_branch_daily_histogram'),
+        )
+        indexes = (
+            models.Index(fields=('branch', 'date'), name='branch_daily_hist_date_idx'),
+        )
+
+    branch = models.ForeignKey('bank.Branch', models.CASCADE, related_name='+', verbose_name=_('отделение'))
+    service = models.ForeignKey('core.Service', models.CASCADE, related_name='+', verbose_name=_('сервис'))
+    date = models.DateField(_('рабочий день'))
+    kind = models.CharField(_('вид'), choices=KIND, max_length=10)
+    bucket = models.PositiveSmallIntegerField(_('интервал'))
+    count = models.PositiveIntegerField(_('количество'), default=0)
+
+    def __str__(self):
+        return f'{self.branch} - {self.service} - {self.date} - {self.kind}: {self.bucket}'
+
 # Create your models here.
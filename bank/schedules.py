@@ -0,0 +1,115 @@
+import threading
+import time
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
+from django.utils import timezone
+
+VERSION_KEY = 'bank:schedule-index:version'
+
+
+class BranchScheduleIndex:
+    """
+    Weekly opening hours of every branch, kept in process memory.
+
+    The index is built with two queries and maps a branch id to seven (start, end) slots, one
+    per weekday, and to the time zone of the branch, so an open/closed check is a dict lookup
+    on the local time of the branch. The version of the index lives
+    in the shared cache and is bumped whenever a schedule is saved or deleted, once the change is
+    committed. Each process
+    looks the version up at most once per ``SCHEDULE_INDEX_CHECK_SECONDS`` and rebuilds its
+    copy when it changed, the process that made the change rebuilds right away.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_until = 0
+        self._index = {}
+        self._zones = {}
+
+    @staticmethod
+    def _build():
+        from bank.models import Branch, BranchSchedule
+
+        days = [day for day, _ in BranchSchedule.DAYS]
+        index = {}
+        schedules = BranchSchedule.objects.order_by('created_at', 'id').values_list(
+            'branch_id', 'week', 'start_time', 'end_time')
+        for branch_id, week, start_time, end_time in schedules:
+            # The latest schedule of a weekday wins, as it did with schedules.filter(week=...).first().
+            week_slots = index.setdefault(branch_id, [None] * 7)
+            week_slots[days.index(week)] = (start_time, end_time)
+        zones = {branch_id: ZoneInfo(name) for branch_id, name in Branch.objects.values_list('id', 'timezone')}
+        return index, zones
+
+    def _current(self):
+        now = time.monotonic()
+        if now < self._checked_until:
+            return self._index, self._zones
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._index, self._zones = self._build()
+                    self._version = version
+        self._checked_until = now + settings.SCHEDULE_INDEX_CHECK_SECONDS
+        return self._index, self._zones
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid4().hex, None)
+        self._checked_until = 0
+
+    def get_day_slot(self, branch_id, weekday):
+        week_slots = self._current()[0].get(branch_id)
+        if week_slots is None:
+            return None
+        return week_slots[weekday]
+
+    def get_timezone(self, branch_id):
+        """ Time zone of a branch, the default one for a branch the index does not know yet. """
+        return self._current()[1].get(branch_id) or timezone.get_default_timezone()
+
+    def localtime(self, branch_id, moment=None):
+        return timezone.localtime(moment, self.get_timezone(branch_id))
+
+    def get_slot(self, branch_id, moment=None):
+        return self.get_day_slot(branch_id, self.localtime(branch_id, moment).weekday())
+
+    def is_open(self, branch_id, moment=None):
+        moment = self.localtime(branch_id, moment)
+        slot = self.get_day_slot(branch_id, moment.weekday())
+        return slot is not None and slot[0] <= moment.time() <= slot[1]
+
+
+schedule_index = BranchScheduleIndex()
+
+
+def open_now_expression(moment=None):
+    """
+    SQL counterpart of the index, for annotating or filtering branch querysets.
+    The schedules are matched on the local time of each branch, one condition per time zone in use.
+    Like in the index, only the latest schedule of a weekday counts.
+    """
+    from bank.models import Branch, BranchSchedule
+
+    later = BranchSchedule.objects.filter(branch=OuterRef('branch'), week=OuterRef('week')).filter(
+        Q(created_at__gt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), id__gt=OuterRef('id')))
+    moment = moment or timezone.now()
+    condition = Q(pk__in=[])
+    for name in Branch.objects.order_by().values_list('timezone', flat=True).distinct():
+        local = timezone.localtime(moment, ZoneInfo(name))
+        condition |= Q(timezone=name) & Q(Exists(BranchSchedule.objects.filter(
+            ~Exists(later),
+            branch=OuterRef('pk'),
+            week=BranchSchedule.DAYS[local.weekday()][0],
+            start_time__lte=local.time(),
+            end_time__gte=local.time(),
+        )))
+    return ExpressionWrapper(condition, output_field=BooleanField())
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from bank import stats
+from bank.models import Branch, BranchSchedule, Queue, Record
+from bank.schedules import schedule_index
+from utils.cache import bump_model_version
+
+
+@receiver(post_save, sender=BranchSchedule)
+@receiver(post_delete, sender=BranchSchedule)
+def invalidate_schedule_index(instance, *args, **kwargs):
+    # Processes rebuilding before the commit would read and keep the old schedules
+    transaction.on_commit(schedule_index.invalidate)
+    bump_model_version(BranchSchedule)
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def invalidate_branch_responses(*args, **kwargs):
+    # The schedule index also holds the time zone of every branch
+    transaction.on_commit(schedule_index.invalidate)
+    bump_model_version(Branch)
+
+
+@receiver(post_save, sender=Record)
+def count_record(instance, created, *args, **kwargs):
+    stats.record_saved(instance, created)
+
+
+@receiver(post_delete, sender=Record)
+def uncount_record(instance, *args, **kwargs):
+    stats.record_deleted(instance)
+
+
+@receiver(post_save, sender=Queue)
+def count_queue(instance, created, *args, **kwargs):
+    if created:
+        stats.count(instance.branch_id, instance.service_id, instance.business_date, issued=1)
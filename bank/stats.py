@@ -0,0 +1,228 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import chain
+from zoneinfo import ZoneInfo
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils.timezone import localtime
+
+from bank.models import BranchDailyHistogram, BranchDailyStats, Queue, QueueArchive, Record
+
+# Upper bounds of the wait and service time buckets in seconds, the last bucket is open-ended
+HISTOGRAM_BOUNDS = (60, 120, 180, 300, 420, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200)
+COUNTERS = ('issued', 'waited', 'wait_seconds', 'served', 'service_seconds', 'booked', 'checked_in', 'canceled')
+RECORD_COUNTERS = {Record.COMPLETED: 'checked_in', Record.CANCELED: 'canceled'}
+BATCH_SIZE = 1000
+
+
+def bucket_for(seconds):
+    return bisect_left(HISTOGRAM_BOUNDS, seconds)
+
+
+def percentile(histogram, quantile):
+    """
+    Upper bound of the bucket the quantile falls in, for a {bucket: count} histogram.
+    Durations past the last bound are reported as the last bound.
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= quantile * total:
+            return HISTOGRAM_BOUNDS[min(bucket, len(HISTOGRAM_BOUNDS) - 1)]
+
+
+def _add(manager, lookup, **increments):
+    """ Adds to the counters of a row with a single UPDATE, creating the row on first use. """
+    queryset = manager.filter(**lookup)
+    values = {name: F(name) + value for name, value in increments.items()}
+    if queryset.update(**values):
+        return
+    try:
+        with transaction.atomic(using=manager.db):
+            manager.create(**lookup, **increments)
+    except IntegrityError:
+        queryset.update(**values)
+
+
+def count(branch_id, service_id, date, **counters):
+    _add(BranchDailyStats.objects, {'branch_id': branch_id, 'service_id': service_id, 'date': date}, **counters)
+
+
+def observe(branch_id, service_id, date, kind, seconds):
+    """ Counts a wait (ticket called) or a service time (ticket completed). """
+    seconds = max(seconds, 0)
+    if kind == BranchDailyHistogram.WAIT:
+        count(branch_id, service_id, date, waited=1, wait_seconds=seconds)
+    else:
+        count(branch_id, service_id, date, served=1, service_seconds=seconds)
+    _add(BranchDailyHistogram.objects, {
+        'branch_id': branch_id,
+        'service_id': service_id,
+        'date': date,
+        'kind': kind,
+        'bucket': bucket_for(seconds),
+    }, count=1)
+
+
+def record_saved(record, created):
+    """ Counts a new booking or a status transition of an existing one. """
+    previous = None if created else getattr(record, 'saved_status', None)
+    record.saved_status = record.status
+    if not created and previous == record.status:
+        return
+    counters = Counter()
+    if created:
+        counters['booked'] += 1
+    if previous in RECORD_COUNTERS:
+        counters[RECORD_COUNTERS[previous]] -= 1
+    if record.status in RECORD_COUNTERS:
+        counters[RECORD_COUNTERS[record.status]] += 1
+    counters = {name: value for name, value in counters.items() if value}
+    if counters:
+        count(record.branch_id, record.service_id, record.branch.local_date(record.meeting_date), **counters)
+
+
+def record_deleted(record):
+    """
+    Takes a deleted booking out of the counters of its day, as rebuild() would leave it out.
+    Only existing rows are updated, the day of a booking counted before always has one.
+    """
+    from bank.schedules import schedule_index
+
+    counters = {'booked': -1}
+    if record.status in RECORD_COUNTERS:
+        counters[RECORD_COUNTERS[record.status]] = -1
+    date = schedule_index.localtime(record.branch_id, record.meeting_date).date()
+    BranchDailyStats.objects.filter(branch_id=record.branch_id, service_id=record.service_id, date=date).update(
+        **{name: F(name) + value for name, value in counters.items()})
+
+
+def records_created(records):
+    """ Counts bookings inserted with bulk_create, which sends no post_save signals. """
+    days = Counter((record.branch_id, record.service_id, record.branch.local_date(record.meeting_date))
+                   for record in records)
+    for (branch_id, service_id, date), booked in days.items():
+        count(branch_id, service_id, date, booked=booked)
+
+
+def report(branch, start, end, service_id=None):
+    """
+    Per-day and total counters with average and p50/p90 wait and service times of a branch
+    between two business days, read from the rollup tables only. Bookings of finished days
+    that were neither checked in nor canceled are counted as no-shows.
+    """
+    stats = BranchDailyStats.objects.filter(branch=branch, date__range=(start, end))
+    histograms = BranchDailyHistogram.objects.filter(branch=branch, date__range=(start, end))
+    if service_id is not None:
+        stats = stats.filter(service_id=service_id)
+        histograms = histograms.filter(service_id=service_id)
+
+    day_histograms = defaultdict(lambda: defaultdict(Counter))
+    for row in histograms.values('date', 'kind', 'bucket').annotate(total=Sum('count')).order_by():
+        day_histograms[row['date']][row['kind']][row['bucket']] += row['total']
+
+    today = branch.local_date()
+    days = []
+    totals = Counter()
+    total_histograms = defaultdict(Counter)
+    for row in stats.values('date').annotate(**{name: Sum(name) for name in COUNTERS}).order_by('date'):
+        row = {'date': row['date'], **{name: row[name] or 0 for name in COUNTERS}}
+        for kind, histogram in day_histograms[row['date']].items():
+            total_histograms[kind].update(histogram)
+        totals.update({name: row[name] for name in COUNTERS})
+        days.append(_summary(row, day_histograms[row['date']], row['date'] < today))
+
+    return {
+        'start': start,
+        'end': end,
+        'totals': _summary({name: totals[name] for name in COUNTERS}, total_histograms, True,
+                           sum(day['no_shows'] for day in days)),
+        'days': days,
+    }
+
+
+def _summary(row, histograms, finished, no_shows=None):
+    if no_shows is None:
+        no_shows = max(row['booked'] - row['checked_in'] - row['canceled'], 0) if finished else 0
+    wait = histograms.get(BranchDailyHistogram.WAIT, {})
+    service = histograms.get(BranchDailyHistogram.SERVICE, {})
+    summary = {name: row[name] for name in row if name not in ('wait_seconds', 'service_seconds')}
+    summary.update({
+        'no_shows': no_shows,
+        'wait_avg': round(row['wait_seconds'] / row['waited']) if row['waited'] else None,
+        'wait_p50': percentile(wait, 0.5),
+        'wait_p90': percentile(wait, 0.9),
+        'service_avg': round(row['service_seconds'] / row['served']) if row['served'] else None,
+        'service_p50': percentile(service, 0.5),
+        'service_p90': percentile(service, 0.9),
+    })
+    return summary
+
+
+def rebuild(since=None, branch_id=None):
+    """
+    Recomputes the rollups from live and archived tickets and from bookings, streaming the rows
+    and writing the aggregates in bulk. Existing rollups of the covered days are replaced.
+    Returns the number of stats rows written.
+    """
+    counters = defaultdict(Counter)
+    histograms = Counter()
+
+    fields = ('branch_id', 'service_id', 'business_date', 'status', 'created_at', 'started_at', 'completed_at')
+    tickets = [Queue.objects.all(), QueueArchive.objects.all()]
+    records = Record.objects.all()
+    if since is not None:
+        tickets = [queryset.filter(business_date__gte=since) for queryset in tickets]
+    if branch_id is not None:
+        tickets = [queryset.filter(branch_id=branch_id) for queryset in tickets]
+        records = records.filter(branch_id=branch_id)
+
+    rows = chain.from_iterable(queryset.values_list(*fields).iterator(chunk_size=BATCH_SIZE) for queryset in tickets)
+    for branch, service, date, status, created_at, started_at, completed_at in rows:
+        key = (branch, service, date)
+        counters[key]['issued'] += 1
+        if started_at is not None:
+            wait = max((started_at - created_at).total_seconds(), 0)
+            counters[key].update(waited=1, wait_seconds=wait)
+            histograms[key + (BranchDailyHistogram.WAIT, bucket_for(wait))] += 1
+        if status == Queue.COMPLETED:
+            counters[key]['served'] += 1
+            if started_at is not None and completed_at is not None:
+                service_time = max((completed_at - started_at).total_seconds(), 0)
+                counters[key]['service_seconds'] += service_time
+                histograms[key + (BranchDailyHistogram.SERVICE, bucket_for(service_time))] += 1
+
+    rows = records.values_list('branch_id', 'service_id', 'meeting_date', 'status', 'branch__timezone')
+    for branch, service, meeting_date, status, timezone in rows.iterator(chunk_size=BATCH_SIZE):
+        date = localtime(meeting_date, ZoneInfo(timezone)).date()
+        if since is not None and date < since:
+            continue
+        counters[branch, service, date]['booked'] += 1
+        if status in RECORD_COUNTERS:
+            counters[branch, service, date][RECORD_COUNTERS[status]] += 1
+
+    stale_stats = BranchDailyStats.objects.all()
+    stale_histograms = BranchDailyHistogram.objects.all()
+    if since is not None:
+        stale_stats = stale_stats.filter(date__gte=since)
+        stale_histograms = stale_histograms.filter(date__gte=since)
+    if branch_id is not None:
+        stale_stats = stale_stats.filter(branch_id=branch_id)
+        stale_histograms = stale_histograms.filter(branch_id=branch_id)
+
+    with transaction.atomic():
+        stale_stats.delete()
+        stale_histograms.delete()
+        BranchDailyStats.objects.bulk_create([
+            BranchDailyStats(branch_id=branch, service_id=service, date=date, **values)
+            for (branch, service, date), values in counters.items()
+        ], batch_size=BATCH_SIZE)
+        BranchDailyHistogram.objects.bulk_create([
+            BranchDailyHistogram(branch_id=branch, service_id=service, date=date, kind=kind, bucket=bucket, count=total)
+            for (branch, service, date, kind, bucket), total in histograms.items()
+        ], batch_size=BATCH_SIZE)
+    return len(counters)
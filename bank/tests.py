@@ -1,3 +1,404 @@
-from django.test import TestCase
+import datetime
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from account.models import User
+from bank.availability import SlotAvailability
+from bank import stats
+from bank.models import Branch, BranchDailyStats, BranchSchedule, Queue, QueueArchive, Record, ServiceTimeStat
+from bank.schedules import BranchScheduleIndex, schedule_index
+from core.models import City, Service
+from utils.deletion import bulk_delete, protected_ids
+
+
+class BranchMixin:
+    """ A branch open 09:00-18:00 every day, with one service. """
+
+    @classmethod
+    def create_branch(cls, **kwargs):
+        branch = Branch.objects.create(city=cls.city, address='Адрес', description='Описание', **kwargs)
+        for week, _ in BranchSchedule.DAYS:
+            BranchSchedule.objects.create(branch=branch, week=week, start_time=datetime.time(9),
+                                          end_time=datetime.time(18))
+        return branch
+
+    @classmethod
+    def create_fixtures(cls):
+        cls.city = City.objects.create(name='Бишкек')
+        cls.service = Service.objects.create(name='Кредиты')
+        cls.branch = cls.create_branch()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+
+    def setUp(self):
+        cache.clear()
+        # The fixtures are never committed, so their on-commit invalidation does not run
+        schedule_index.invalidate()
+
+
+class FreeSlotsTests(BranchMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() + datetime.timedelta(days=7)
+        self.url = f'/api/v1/bank/branches/{self.branch.pk}/free_slots/'
+        self.params = {'service': self.service.pk, 'date': self.day.isoformat(), 'days': 1}
+
+    def free_slots(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        return [datetime.datetime.fromisoformat(slot) for slot in response.json()['days'][0]['slots']]
+
+    def test_booked_slot_is_not_offered(self):
+        slots = self.free_slots()
+        self.assertEqual(len(slots), 18)
+
+        record = Record.objects.create(name='Клиент', branch=self.branch, service=self.service, meeting_date=slots[2])
+        self.assertNotIn(slots[2], self.free_slots())
+        self.assertEqual(len(self.free_slots()), 17)
+
+        record.status = Record.CANCELED
+        record.save()
+        self.assertIn(slots[2], self.free_slots())
+
+    def test_off_grid_booking_blocks_the_slots_it_overlaps(self):
+        slots = self.free_slots()
+        step = slots[1] - slots[0]
+        Record.objects.create(name='Клиент', branch=self.branch, service=self.service,
+                              meeting_date=slots[2] + step / 2)
+        free = self.free_slots()
+        self.assertNotIn(slots[2], free)
+        self.assertNotIn(slots[3], free)
+        self.assertIn(slots[1], free)
+        self.assertIn(slots[4], free)
+
+
+class BookingValidationTests(BranchMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(phone='+996555000001', email='user@example.com')
+        self.client.force_login(user)
+
+    def booking(self, hour, minute=0):
+        meeting_date = datetime.datetime.combine(self.branch.local_date() + datetime.timedelta(days=1),
+                                                 datetime.time(hour, minute), ZoneInfo(self.branch.timezone))
+        return {'name': 'Клиент', 'branch': self.branch.pk, 'service': self.service.pk,
+                'meeting_date': meeting_date.isoformat()}
+
+    def test_single_and_bulk_bookings_check_opening_hours_at_the_meeting_time(self):
+        single = self.client.post('/api/v1/bank/records/', self.booking(10))
+        bulk = self.client.post('/api/v1/bank/records/bulk_create/', {'records': [self.booking(10, 30)]},
+                                content_type='application/json')
+        self.assertEqual((single.status_code, bulk.status_code), (201, 201))
+
+        single = self.client.post('/api/v1/bank/records/', self.booking(20))
+        bulk = self.client.post('/api/v1/bank/records/bulk_create/', {'records': [self.booking(20)]},
+                                content_type='application/json')
+        self.assertEqual((single.status_code, bulk.status_code), (400, 400))
+        self.assertEqual(single.json(), bulk.json()['errors'][0]['errors'])
+
+
+class RecordStatusTests(BranchMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser(phone='+996555000000', email='admin@example.com', password='secret')
+        self.client.force_login(admin)
+        meeting_date = timezone.now() + datetime.timedelta(days=1)
+        self.canceled = Record.objects.create(name='Клиент', branch=self.branch, service=self.service,
+                                              meeting_date=meeting_date, status=Record.CANCELED)
+        Record.objects.create(name='Клиент', branch=self.branch, service=self.service, meeting_date=meeting_date)
+        self.url = f'/api/v1/bank/records/{self.canceled.pk}/'
+
+    def assertSlotTaken(self, response):
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('branch', response.json())
+        self.canceled.refresh_from_db()
+        self.assertEqual(self.canceled.status, Record.CANCELED)
+
+    def test_reverting_to_waiting_on_a_taken_slot_is_rejected(self):
+        self.assertSlotTaken(self.client.patch(self.url, {'status': Record.WAITING}, content_type='application/json'))
+
+    def test_slot_taken_after_validation_is_rejected(self):
+        with mock.patch('api.bank.serializers.UpdateRecordSerializer.validate', side_effect=lambda attrs: attrs):
+            response = self.client.patch(self.url, {'status': Record.WAITING}, content_type='application/json')
+        self.assertSlotTaken(response)
+
+
+class IndexUsageTests(BranchMixin, TestCase):
+    """ The hot booking and queue queries are answered from their indexes. """
+
+    def assertUsesIndex(self, queryset, *index_names):
+        if connection.vendor == 'postgresql':
+            # The test tables are so small that the planner would read them sequentially
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_slot_lookup_uses_waiting_slot_index(self):
+        days = [timezone.localdate()]
+        self.assertUsesIndex(SlotAvailability(self.branch.pk, self.service.pk).booked(days),
+                             'record_unique_waiting_slot')
+
+    @staticmethod
+    def column_index_names(model, column):
+        """ Names of the indexes on a single column, which the database names itself for unique fields. """
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor != 'sqlite':
+                constraints = connection.introspection.get_constraints(cursor, table)
+                return [name for name, info in constraints.items() if info['columns'] == [column]]
+            # The introspection of SQLite leaves out the names of the automatic indexes
+            cursor.execute(f'PRAGMA index_list({connection.ops.quote_name(table)})')
+            names = [row[1] for row in cursor.fetchall()]
+            indexed = []
+            for name in names:
+                cursor.execute(f'PRAGMA index_info({connection.ops.quote_name(name)})')
+                if [row[2] for row in cursor.fetchall()] == [column]:
+                    indexed.append(name)
+            return indexed
+
+    def test_claim_uses_queue_day_index(self):
+        self.assertUsesIndex(Queue.objects._waiting(self.branch, self.service.pk), 'queue_branch_day_idx')
+
+    def test_check_in_uses_record_code_index(self):
+        start = timezone.now() + datetime.timedelta(days=1)
+        Record.objects.bulk_create(
+            Record(name='Клиент', branch=self.branch, service=self.service,
+                   meeting_date=start + datetime.timedelta(minutes=30 * index))
+            for index in range(200)
+        )
+        if connection.vendor == 'postgresql':
+            # Without statistics every index looks as selective as the unique one
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Record._meta.db_table}')
+        # The lookup of Queue.objects.check_in
+        queryset = Record.objects.select_for_update().filter(code='ABC123', status=Record.WAITING)
+        # Either the unique index of the code or, on PostgreSQL, its twin for LIKE lookups
+        self.assertUsesIndex(queryset, *self.column_index_names(Record, 'code'))
+
+
+class EstimateWaitTests(BranchMixin, TestCase):
+
+    def test_only_tickets_of_the_same_service_are_ahead(self):
+        other = Service.objects.create(name='Переводы')
+        hour = timezone.localtime().hour
+        ServiceTimeStat.objects.create(branch=self.branch, service=self.service, hour=hour, average=100, count=10)
+        ServiceTimeStat.objects.create(branch=self.branch, service=other, hour=hour, average=1000, count=10)
+        for service in (self.service, other, other, self.service, other):
+            Queue.objects.issue(self.branch, service)
+        queue = Queue.objects.issue(self.branch, self.service)
+
+        response = self.client.get(f'/api/v1/bank/queues/{queue.pk}/eta/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['people_ahead'], 2)
+        self.assertEqual(response.json()['estimated_wait'], 200)
+
+
+class StatsTests(BranchMixin, TestCase):
+
+    def counters(self):
+        return list(BranchDailyStats.objects.order_by('date').values('date', 'booked', 'checked_in', 'canceled',
+                                                                      'served'))
+
+    def test_service_time_is_counted_after_commit(self):
+        queue = Queue.objects.issue(self.branch, self.service)
+        Queue.objects.claim_next(self.branch)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(Queue.objects.complete(queue.pk))
+            self.assertFalse(ServiceTimeStat.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(ServiceTimeStat.objects.get().count, 1)
+        self.assertEqual(BranchDailyStats.objects.get().served, 1)
+
+    def test_deleted_bookings_are_taken_out_of_the_counters(self):
+        meeting_date = datetime.datetime.combine(self.branch.local_date() + datetime.timedelta(days=1),
+                                                 datetime.time(10), ZoneInfo(self.branch.timezone))
+        records = [
+            Record.objects.create(name='Клиент', branch=self.branch, service=self.service, status=status,
+                                  meeting_date=meeting_date + datetime.timedelta(minutes=15 * index))
+            for index, status in enumerate((Record.WAITING, Record.CANCELED, Record.COMPLETED, Record.WAITING))
+        ]
+        records[0].delete()
+        bulk_delete(Record.objects.all(), [records[1].pk, records[2].pk])
+
+        counters = self.counters()
+        self.assertEqual((counters[0]['booked'], counters[0]['checked_in'], counters[0]['canceled']), (1, 0, 0))
+        stats.rebuild()
+        self.assertEqual(self.counters(), counters)
+
+
+class BranchTimezoneTests(BranchMixin, TestCase):
+    """ A branch in New York, while the project time is Bishkek time, UTC+6. """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.branch.timezone = 'America/New_York'
+        cls.branch.save()
+
+    def test_opening_hours_are_local_to_the_branch(self):
+        # 10:00 in New York, 21:00 in Bishkek
+        evening = datetime.datetime(2026, 1, 5, 15, tzinfo=datetime.timezone.utc)
+        # 22:00 in New York, 09:00 in Bishkek
+        morning = datetime.datetime(2026, 1, 6, 3, tzinfo=datetime.timezone.utc)
+        self.assertTrue(schedule_index.is_open(self.branch.pk, evening))
+        self.assertFalse(schedule_index.is_open(self.branch.pk, morning))
+        self.assertTrue(Branch.objects.with_is_open(evening).get(pk=self.branch.pk).is_open)
+        self.assertFalse(Branch.objects.with_is_open(morning).get(pk=self.branch.pk).is_open)
+
+    def test_free_slots_are_laid_out_in_the_branch_time_zone(self):
+        day = self.branch.local_date() + datetime.timedelta(days=7)
+        response = self.client.get(f'/api/v1/bank/branches/{self.branch.pk}/free_slots/',
+                                   {'service': self.service.pk, 'date': day.isoformat(), 'days': 1})
+        first = datetime.datetime.fromisoformat(response.json()['days'][0]['slots'][0])
+        self.assertEqual(first, datetime.datetime.combine(day, datetime.time(9), ZoneInfo('America/New_York')))
+
+
+class ScheduleIndexTests(BranchMixin, TestCase):
+
+    def test_other_process_sees_schedule_change_after_check_interval(self):
+        # The index of another worker process, only the default cache is shared with it
+        other = BranchScheduleIndex()
+        self.assertEqual(other.get_day_slot(self.branch.pk, 0), (datetime.time(9), datetime.time(18)))
+
+        schedule = self.branch.schedules.get(week=BranchSchedule.MONDAY)
+        schedule.start_time = datetime.time(10)
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule.save()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(other.get_day_slot(self.branch.pk, 0), (datetime.time(9), datetime.time(18)))
+        with mock.patch('bank.schedules.time.monotonic', return_value=time.monotonic() + 10):
+            self.assertEqual(other.get_day_slot(self.branch.pk, 0), (datetime.time(10), datetime.time(18)))
+
+    def test_index_is_invalidated_when_the_transaction_commits(self):
+        index = BranchScheduleIndex()
+        index.get_day_slot(self.branch.pk, 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            BranchSchedule.objects.filter(branch=self.branch, week=BranchSchedule.MONDAY).delete()
+            self.branch.schedules.create(week=BranchSchedule.MONDAY, start_time=datetime.time(10),
+                                         end_time=datetime.time(18))
+            # A rebuild now would keep the uncommitted schedules as the current version
+            with mock.patch('bank.schedules.time.monotonic', return_value=time.monotonic() + 10):
+                self.assertEqual(index.get_day_slot(self.branch.pk, 0), (datetime.time(9), datetime.time(18)))
+        self.assertTrue(callbacks)
+
+    def test_latest_schedule_of_a_weekday_wins_in_index_and_sql(self):
+        # A stale 09:00-18:00 Monday and a later 14:00-18:00 one
+        with self.captureOnCommitCallbacks(execute=True):
+            later = self.branch.schedules.create(week=BranchSchedule.MONDAY, start_time=datetime.time(14),
+                                                 end_time=datetime.time(18))
+            BranchSchedule.objects.filter(pk=later.pk).update(created_at=later.created_at + datetime.timedelta(days=1))
+        monday_morning = datetime.datetime(2026, 1, 5, 10, tzinfo=schedule_index.get_timezone(self.branch.pk))
+        monday_afternoon = monday_morning.replace(hour=15)
+        for moment, expected in ((monday_morning, False), (monday_afternoon, True)):
+            self.assertIs(schedule_index.is_open(self.branch.pk, moment), expected)
+            self.assertIs(Branch.objects.with_is_open(moment).get(pk=self.branch.pk).is_open, expected)
+
+    def test_lookups_within_check_interval_do_not_query(self):
+        index = BranchScheduleIndex()
+        index.get_day_slot(self.branch.pk, 0)
+        with self.assertNumQueries(0):
+            for weekday in range(7):
+                index.get_day_slot(self.branch.pk, weekday)
+
+
+class BulkDeleteTests(BranchMixin, TestCase):
+
+    def test_branch_referenced_only_through_a_hidden_relation_is_protected(self):
+        archived = self.create_branch()
+        now = timezone.now()
+        QueueArchive.objects.create(id=1, branch=archived, service=self.service, value=1, type=Queue.SIMPLE,
+                                    status=Queue.COMPLETED, business_date=now.date(), created_at=now,
+                                    updated_at=now)
+        unused = self.create_branch()
+
+        ids = [self.branch.pk, archived.pk, unused.pk]
+        self.assertEqual(protected_ids(Branch, ids), {archived.pk})
+        self.assertEqual(bulk_delete(Branch.objects.all(), ids), [archived.pk])
+        self.assertEqual(set(Branch.objects.values_list('pk', flat=True)), {archived.pk})
+
+
+def issue_tickets_in_process(branch_id, service_id, count, barrier, results):
+    try:
+        branch = Branch.objects.get(pk=branch_id)
+        service = Service.objects.get(pk=service_id)
+        barrier.wait()
+        results.put([Queue.objects.issue(branch, service).value for _ in range(count)])
+    except Exception as e:
+        results.put(e)
+    finally:
+        connection.close()
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class QueueCounterConcurrencyTests(BranchMixin, TransactionTestCase):
+    threads = 8
+    processes = 4
+    tickets_per_thread = 25
+
+    def setUp(self):
+        super().setUp()
+        self.create_fixtures()
+
+    def issue_tickets(self, barrier):
+        try:
+            barrier.wait()
+            return [Queue.objects.issue(self.branch, self.service).value for _ in range(self.tickets_per_thread)]
+        finally:
+            connection.close()
+
+    def test_parallel_tickets_are_unique_and_contiguous(self):
+        barrier = threading.Barrier(self.threads)
+        with ThreadPoolExecutor(self.threads) as executor:
+            results = list(executor.map(self.issue_tickets, [barrier] * self.threads))
+
+        self.assertUniqueAndContiguous(results, self.threads)
+
+    def test_tickets_of_parallel_processes_are_unique_and_contiguous(self):
+        # Several workers of a deployment, each with its own connection and no shared Python lock
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Other processes cannot open an in-memory database')
+        context = multiprocessing.get_context('fork')
+        barrier = context.Barrier(self.processes)
+        results = context.Queue()
+        # The forked processes must open connections of their own
+        connections.close_all()
+        processes = [
+            context.Process(target=issue_tickets_in_process,
+                            args=(self.branch.pk, self.service.pk, self.tickets_per_thread, barrier, results))
+            for _ in range(self.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            results = [results.get(timeout=60) for _ in processes]
+        finally:
+            for process in processes:
+                process.join()
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        self.assertUniqueAndContiguous(results, self.processes)
+
+    def assertUniqueAndContiguous(self, results, workers):
+        values = sorted(value for result in results for value in result)
+        self.assertEqual(values, list(range(1, workers * self.tickets_per_thread + 1)))
+        self.assertEqual(
+            sorted(Queue.objects.filter(branch=self.branch).values_list('value', flat=True)), values,
+        )
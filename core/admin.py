@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from core.models import City, Service
+from core.models import City, OutgoingEmail, Service
 
 
 @admin.register(City)
@@ -18,4 +18,13 @@ class ServiceAdmin(admin.ModelAdmin):
     search_fields = ('id', 'name',)
     readonly_fields = ('created_at', 'updated_at',)
 
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subject', 'to', 'status', 'attempts', 'send_after', 'sent_at',)
+    list_display_links = ('id', 'subject',)
+    list_filter = ('status',)
+    search_fields = ('id', 'subject', 'to',)
+    readonly_fields = ('created_at', 'updated_at', 'sent_at', 'last_error',)
+
 # Register your models here.
@@ -6,3 +6,7 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = _('Прочие')
+
+    def ready(self):
+        import core.checks
+        import core.signals
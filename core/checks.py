@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """ Token revocations and cache invalidations only reach other workers through a shared cache. """
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            'The default cache is local to each process.',
+            hint='Revoked tokens and stale responses would be served by other workers, configure REDIS_URL '
+                 'or a database cache.',
+            id='core.W001',
+        )]
+    return []
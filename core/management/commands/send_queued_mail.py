@@ -0,0 +1,39 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.outbox import Worker
+
+
+class Command(BaseCommand):
+    help = 'Sends the emails of the outbox, retrying failed ones with backoff.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Workers, each with its own mail connection')
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails claimed by a worker at once')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls of an empty outbox')
+        parser.add_argument('--once', action='store_true', help='Exit once no email is due')
+
+    def handle(self, *args, workers, batch_size, interval, once, **options):
+        if workers > 1 and not connection.features.has_select_for_update_skip_locked:
+            # Without SKIP LOCKED concurrent workers could claim the same emails
+            self.stderr.write(f'{connection.vendor} can not lock rows, running a single worker')
+            workers = 1
+
+        stop = threading.Event()
+        pool = [Worker(stop, batch_size, interval, once, name=f'mail-worker-{index}') for index in range(workers)]
+        for worker in pool:
+            worker.start()
+        try:
+            for worker in pool:
+                while worker.is_alive():
+                    worker.join(1)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in pool:
+                worker.join()
+
+        sent = sum(worker.sent for worker in pool)
+        failed = sum(worker.failed for worker in pool)
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed'))
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+
+class OutgoingEmailManager(models.Manager):
+
+    def enqueue(self, subject, body, to, html_body='', from_email=None):
+        return self.create(subject=subject, body=body, to=list(to), html_body=html_body or '',
+                           from_email=from_email or '')
+
+    def claim(self, batch_size):
+        """
+        Takes due emails for the calling worker. Rows locked by another worker are skipped and the
+        claimed ones are postponed by the lease, so they stay taken after the transaction commits
+        and come back by themselves if the worker dies before reporting them.
+        """
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            emails = list(
+                self.select_for_update(skip_locked=True)
+                .filter(status=self.model.PENDING, send_after__lte=now)
+                .order_by('send_after', 'id')[:batch_size]
+            )
+            if emails:
+                lease = now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+                self.filter(pk__in=[email.pk for email in emails]).update(send_after=lease)
+        return emails
+
+    def sent(self, email):
+        """ Marks an email sent and drops its text, which may hold secrets such as password reset links. """
+        self.filter(pk=email.pk).update(
+            status=self.model.SENT, sent_at=timezone.now(), attempts=F('attempts') + 1, last_error='',
+            body='', html_body='',
+        )
+
+    def failed(self, email, error):
+        """ Schedules another attempt with exponential backoff, or gives the email up. """
+        attempts = email.attempts + 1
+        if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            status, send_after = self.model.FAILED, email.send_after
+        else:
+            delay = settings.EMAIL_OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1)
+            status, send_after = self.model.PENDING, timezone.now() + timedelta(seconds=delay)
+        self.filter(pk=email.pk).update(status=status, attempts=attempts, send_after=send_after,
+                                        last_error=str(error) or type(error).__name__)
+
+    def purge(self, before):
+        """ Deletes the emails sent before ``before``, returns how many. """
+        return self.filter(status=self.model.SENT, sent_at__lt=before).delete()[0]
@@ -1,5 +1,9 @@
+from django.core.mail import EmailMultiAlternatives
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+
+from core.managers import OutgoingEmailManager
 from utils.models import TimeStampAbstractModel
 
 
@@ -26,4 +30,47 @@ class Service(TimeStampAbstractModel):
     def __str__(self):
         return f'{self.name}'
 
-# Create your models here.
+
+class OutgoingEmail(TimeStampAbstractModel):
+    """ An email waiting in the outbox, sent by the send_queued_mail workers. """
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS = (
+        (PENDING, _('В очереди')),
+        (SENT, _('Отправлено')),
+        (FAILED, _('Не отправлено')),
+    )
+
+    class Meta:
+        verbose_name = _('письмо')
+        verbose_name_plural = _('исходящие письма')
+        ordering = ('-created_at', '-updated_at')
+        indexes = (
+            models.Index(fields=('status', 'send_after'), name='outgoing_email_due_idx'),
+        )
+
+    subject = models.CharField(_('тема'), max_length=255)
+    body = models.TextField(_('текст'))
+    html_body = models.TextField(_('HTML'), blank=True)
+    from_email = models.CharField(_('отправитель'), max_length=254, blank=True)
+    to = models.JSONField(_('получатели'))
+    status = models.CharField(_('статус'), max_length=20, default=PENDING, choices=STATUS)
+    attempts = models.PositiveSmallIntegerField(_('попытки'), default=0)
+    send_after = models.DateTimeField(_('отправить после'), default=timezone.now)
+    sent_at = models.DateTimeField(_('дата отправки'), null=True, blank=True)
+    last_error = models.TextField(_('последняя ошибка'), blank=True)
+
+    objects = OutgoingEmailManager()
+
+    def __str__(self):
+        return f'{", ".join(self.to)}: {self.subject}'
+
+    def message(self, connection=None):
+        message = EmailMultiAlternatives(self.subject, self.body, self.from_email or None, self.to,
+                                         connection=connection)
+        if self.html_body:
+            message.attach_alternative(self.html_body, 'text/html')
+        return message
+
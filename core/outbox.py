@@ -0,0 +1,93 @@
+import logging
+import smtplib
+import threading
+from contextlib import suppress
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections, connection as db_connection
+from django.utils import timezone
+
+from core.models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+SEND_ERRORS = (smtplib.SMTPException, OSError)
+
+
+def close_quietly(connection):
+    with suppress(*SEND_ERRORS):
+        connection.close()
+
+
+def deliver(emails, connection):
+    """
+    Sends claimed emails over an already opened mail connection. Each email is marked sent or
+    failed as soon as it was attempted, and any error fails that email only. A failed email is
+    scheduled for a retry and the connection is reopened for the next one, as the server may
+    have dropped it.
+    """
+    sent = failed = 0
+    for email in emails:
+        try:
+            connection.open()
+            if not connection.send_messages([email.message(connection)]):
+                raise smtplib.SMTPRecipientsRefused({recipient: (550, b'') for recipient in email.to})
+        except Exception as exc:
+            logger.warning('Sending email %s failed: %s', email.pk, exc, exc_info=not isinstance(exc, SEND_ERRORS))
+            close_quietly(connection)
+            OutgoingEmail.objects.failed(email, exc)
+            failed += 1
+        else:
+            OutgoingEmail.objects.sent(email)
+            sent += 1
+    return sent, failed
+
+
+class Worker(threading.Thread):
+    """
+    Drains the outbox in batches over a single mail connection that stays open while there is work
+    and is closed when the outbox is empty, so idle workers do not hold SMTP sessions. An idle
+    worker also deletes the emails sent more than EMAIL_OUTBOX_KEEP_SENT_SECONDS ago. Errors, such
+    as a lost database, are logged and the worker tries again after ``interval``.
+    """
+
+    def __init__(self, stop, batch_size, interval, once, name=None):
+        super().__init__(name=name, daemon=True)
+        self.stop = stop
+        self.batch_size = batch_size
+        self.interval = interval
+        self.once = once
+        self.sent = self.failed = 0
+
+    def send_batch(self, connection):
+        """ Sends a batch of due emails, returns False when there was none. """
+        close_old_connections()
+        emails = OutgoingEmail.objects.claim(self.batch_size)
+        if not emails:
+            return False
+        sent, failed = deliver(emails, connection)
+        self.sent += sent
+        self.failed += failed
+        return True
+
+    def run(self):
+        connection = get_connection()
+        try:
+            while not self.stop.is_set():
+                try:
+                    if self.send_batch(connection):
+                        continue
+                    close_quietly(connection)
+                    OutgoingEmail.objects.purge(
+                        timezone.now() - timedelta(seconds=settings.EMAIL_OUTBOX_KEEP_SENT_SECONDS))
+                except Exception:
+                    logger.exception('Mail worker %s failed', self.name)
+                    close_quietly(connection)
+                if self.once:
+                    break
+                self.stop.wait(self.interval)
+        finally:
+            close_quietly(connection)
+            db_connection.close()
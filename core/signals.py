@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import City, Service
+from utils.cache import bump_model_version
+
+
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=Service)
+def invalidate_responses(sender, *args, **kwargs):
+    bump_model_version(sender)
@@ -1,3 +1,166 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import BrowsableAPIRenderer
+
+from api.api import CityViewSet
+from api.renderers import ORJSONRenderer
+from core.models import City, OutgoingEmail
+from core.outbox import Worker, deliver
+
+
+class ResponseCacheTests(TestCase):
+    url = '/api/v1/cities/'
+
+    def setUp(self):
+        cache.clear()
+        self.city = City.objects.create(name='Бишкек')
+
+    def test_matching_etag_is_answered_with_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_cached_response_is_identical(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_saving_a_row_invalidates_list_and_detail(self):
+        list_etag = self.client.get(self.url)['ETag']
+        detail_url = f'{self.url}{self.city.pk}/'
+        detail_etag = self.client.get(detail_url)['ETag']
+
+        self.city.name = 'Ош'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], list_etag)
+        self.assertIn('Ош', response.content.decode())
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Ош')
+
+    def test_deleting_a_row_invalidates_list(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 0)
+
+    def test_version_changes_when_the_transaction_commits(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            City.objects.create(name='Ош')
+            # Until the commit other connections still read the old rows
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_response_keeps_vary_and_allow(self):
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertIn('Accept', first['Vary'])
+        for response in (second, not_modified):
+            self.assertEqual(response['Vary'], first['Vary'])
+            self.assertEqual(response['Allow'], first['Allow'])
+
+    def test_host_is_part_of_the_key(self):
+        City.objects.create(name='Ош')
+        first = self.client.get(self.url, {'limit': 1}, HTTP_HOST='one.example.com')
+        second = self.client.get(self.url, {'limit': 1}, HTTP_HOST='two.example.com')
+        self.assertTrue(first.json()['next'].startswith('http://one.example.com/'))
+        self.assertTrue(second.json()['next'].startswith('http://two.example.com/'))
+
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_browsable_api_is_not_cached(self):
+        with mock.patch.object(CityViewSet, 'renderer_classes', [ORJSONRenderer, BrowsableAPIRenderer]):
+            response = self.client.get(self.url, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+# The worker closes the database connection when it stops, which would end the test transaction
+@mock.patch('core.outbox.db_connection', mock.Mock())
+@mock.patch('core.outbox.close_old_connections', mock.Mock())
+class OutboxTests(TestCase):
+
+    def enqueue(self, to):
+        return OutgoingEmail.objects.enqueue('Сброс пароля', 'https://example.com/reset/secret', [to])
+
+    def test_error_of_one_email_does_not_affect_the_others(self):
+        emails = [self.enqueue(f'user{index}@example.com') for index in range(3)]
+        message = OutgoingEmail.message
+
+        def broken_second(email, connection=None):
+            if email.pk == emails[1].pk:
+                raise ValueError('Malformed email')
+            return message(email, connection)
+
+        with mock.patch.object(OutgoingEmail, 'message', broken_second), self.assertLogs('core.outbox', 'WARNING'):
+            self.assertEqual(deliver(OutgoingEmail.objects.claim(10), get_connection()), (2, 1))
+
+        self.assertEqual(len(mail.outbox), 2)
+        statuses = dict(OutgoingEmail.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {emails[0].pk: OutgoingEmail.SENT, emails[1].pk: OutgoingEmail.PENDING,
+                                    emails[2].pk: OutgoingEmail.SENT})
+        failed = OutgoingEmail.objects.get(pk=emails[1].pk)
+        self.assertEqual((failed.attempts, failed.last_error), (1, 'Malformed email'))
+
+    def test_sent_email_text_is_dropped(self):
+        email = self.enqueue('user@example.com')
+        deliver(OutgoingEmail.objects.claim(10), get_connection())
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.body, email.html_body), (OutgoingEmail.SENT, '', ''))
+
+    def test_worker_survives_database_errors(self):
+        self.enqueue('user@example.com')
+        stop = threading.Event()
+        claim = OutgoingEmail.objects.claim
+        calls = iter([DatabaseError('connection lost'), None])
+
+        def flaky_claim(batch_size):
+            error = next(calls, None)
+            if error is not None:
+                raise error
+            emails = claim(batch_size)
+            if not emails:
+                stop.set()
+            return emails
+
+        worker = Worker(stop, batch_size=10, interval=0, once=False)
+        with mock.patch.object(OutgoingEmail.objects, 'claim', flaky_claim), self.assertLogs('core.outbox', 'ERROR'):
+            worker.run()
+        self.assertEqual(worker.sent, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_idle_worker_purges_old_sent_emails(self):
+        old, recent, pending = (self.enqueue(f'user{index}@example.com') for index in range(3))
+        OutgoingEmail.objects.filter(pk=old.pk).update(status=OutgoingEmail.SENT,
+                                                       sent_at=timezone.now() - timedelta(days=2))
+        OutgoingEmail.objects.filter(pk=recent.pk).update(status=OutgoingEmail.SENT, sent_at=timezone.now())
+        OutgoingEmail.objects.filter(pk=pending.pk).update(send_after=timezone.now() + timedelta(hours=1))
+
+        Worker(threading.Event(), batch_size=10, interval=0, once=True).run()
+        self.assertEqual(set(OutgoingEmail.objects.values_list('pk', flat=True)), {recent.pk, pending.pk})
@@ -1,3 +1,99 @@
-from django.shortcuts import render
+import mimetypes
+import re
+from pathlib import Path
+from urllib.parse import quote
 
-# Create your views here.
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """ Reads ``length`` bytes of a file from ``start``, for ranged responses. """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _byte_range(header, size):
+    """ (start, end) of a single range request header, None if it is not satisfiable. """
+    match = RANGE.match(header)
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return None
+    return start, end
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves an uploaded file. With MEDIA_ACCEL set, the web server in front sends the file, ranges
+    and conditional requests included, and the worker only checks that the file exists. Otherwise
+    the file is sent by the app with support for If-Modified-Since and single byte ranges.
+    """
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404
+    if not fullpath.is_file():
+        raise Http404
+
+    content_type, encoding = mimetypes.guess_type(fullpath.name)
+    content_type = content_type or 'application/octet-stream'
+    if settings.MEDIA_ACCEL == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_LOCATION + quote(path)
+    elif settings.MEDIA_ACCEL == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = str(fullpath)
+    else:
+        stat = fullpath.stat()
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        byte_range = None
+        if 'HTTP_RANGE' in request.META:
+            byte_range = _byte_range(request.META['HTTP_RANGE'], stat.st_size)
+            if byte_range is None:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+        if byte_range is None:
+            response = FileResponse(fullpath.open('rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = FileResponse(FileRange(fullpath.open('rb'), start, end - start + 1),
+                                    content_type=content_type, status=206)
+            response['Content-Length'] = end - start + 1
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    return response
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from api.bank.consumers import QUEUE_BOARD_PATH, queue_board_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if QUEUE_BOARD_PATH.match(scope['path']):
+            return await queue_board_websocket(scope, receive, send)
+        await receive()
+        return await send({'type': 'websocket.close', 'code': 4404})
+    return await django_application(scope, receive, send)
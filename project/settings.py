@@ -13,7 +13,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 from pathlib import Path
 from decouple import config
 from django.utils.translation import gettext_lazy as _
-import os, json
+import os, json, sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'whitenoise.runserver_nostatic',
     'django.contrib.staticfiles',
     'django_filters',
     'django_cleanup',
@@ -57,6 +58,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -110,6 +112,24 @@ else:
         }
     }
 
+# Tokens, cached responses and the versions that invalidate them are read by every worker
+# process, so the cache has to be shared: Redis when configured, the database otherwise
+# (after manage.py createcachetable)
+if config('REDIS_URL', default=''):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -154,6 +174,31 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static', 'static_root')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Static files are served by WhiteNoise. Deployments set STATIC_MANIFEST and run collectstatic,
+# which writes content-hashed copies with gzip and brotli variants, served with far-future cache
+# headers. Without it, as in development and tests, the files are found in the app directories
+# on every request and no collectstatic is needed.
+STATIC_MANIFEST = config('STATIC_MANIFEST', default=False, cast=bool)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage' if STATIC_MANIFEST
+        else 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+if not STATIC_MANIFEST:
+    WHITENOISE_USE_FINDERS = True
+    WHITENOISE_AUTOREFRESH = True
+
+# How core.views.serve_media hands uploaded files to the web server in front of the app:
+# 'x-accel-redirect' for nginx, with an internal location at MEDIA_ACCEL_LOCATION aliased to
+# MEDIA_ROOT, 'x-sendfile' for Apache mod_xsendfile or lighttpd, empty to send them from the app
+MEDIA_ACCEL = config('MEDIA_ACCEL', default='')
+MEDIA_ACCEL_LOCATION = config('MEDIA_ACCEL_LOCATION', default='/protected-media/')
+MEDIA_MAX_AGE = 24 * 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -162,35 +207,90 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'account.User'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_USE_TLS = json.loads(config('EMAIL_USE_TLS'))
 EMAIL_USE_SSL = json.loads(config('EMAIL_USE_SSL'))
 EMAIL_PORT = int(config('EMAIL_PORT'))
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = 30
+
+# Attempts before an outgoing email is given up, seconds before its first retry (doubled for
+# every following one), seconds a worker may hold a claimed email before others retake it
+# and seconds a sent email is kept in the outbox
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_SECONDS = 60
+EMAIL_OUTBOX_LEASE_SECONDS = 5 * 60
+EMAIL_OUTBOX_KEEP_SENT_SECONDS = 24 * 60 * 60
 
 EXPIRE_DAYS = int(config('EXPIRE_DAYS'))
 FRONTEND_HOST = config('FRONTEND_HOST')
 FRONTED_RESET_PASSWORD_LINK = config('FRONTED_RESET_PASSWORD_LINK')
 QUERY_FIELD_NAME_RP = config('FRONTED_RESET_PASSWORD_LINK')
 
+# Seconds between two recorded activities of the same user, seconds between bulk writes
+# and the number of buffered users that forces a write
+LAST_ACTIVITY_THROTTLE = 60
+LAST_ACTIVITY_FLUSH_INTERVAL = 10
+LAST_ACTIVITY_MAX_PENDING = 1000
+# Write buffered activity from a timer thread and at exit, not in manage.py test, whose database is gone by then
+LAST_ACTIVITY_BACKGROUND = sys.argv[1:2] != ['test']
+
+# Seconds a process uses its copy of the branch schedules before checking they did not change
+SCHEDULE_INDEX_CHECK_SECONDS = 5
+
+# Length of an appointment slot offered for records
+RECORD_SLOT_MINUTES = 30
+
+# Side in pixels of the square avatar renditions, twice the size they are displayed at
+AVATAR_RENDITIONS = {
+    'thumbnail': 96,
+    'list': 240,
+    'full': 500,
+}
+AVATAR_QUALITY = 90
+# Largest avatar upload accepted, in bytes and in pixels on its longer side
+AVATAR_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+AVATAR_MAX_SIDE = 4096
+
+# Seconds since the last activity during which a user is considered online
+USER_ONLINE_TIMEOUT = 5 * 60
+
+# Weight of the latest service time in the moving averages of the wait estimates,
+# and the service time assumed for branches without history, in seconds
+QUEUE_SERVICE_TIME_ALPHA = 0.2
+QUEUE_DEFAULT_SERVICE_SECONDS = 5 * 60
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        'api.renderers.ORJSONRenderer',
+        # The browsable API is only rendered in development
+        *(['rest_framework.renderers.BrowsableAPIRenderer'] if DEBUG else []),
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'api.paginations.StandardResultsSetPagination',
     'PAGE_SIZE': 50,
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
     ],
 }
 
+TOKEN_EXPIRE_DAYS = 30
+# Size and lifetime of the in-process token cache and lifetime of the shared one, in seconds
+TOKEN_LOCAL_CACHE_SIZE = 10000
+TOKEN_LOCAL_CACHE_TIMEOUT = 5
+TOKEN_CACHE_TIMEOUT = 60
+
 REST_REGISTRATION = {
     'LOGIN_RETRIEVE_TOKEN': True,
     'REGISTER_VERIFICATION_ENABLED': False,
@@ -0,0 +1,26 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_PREFIX = 'model-version:'
+
+
+def _version_key(model):
+    return f'{VERSION_PREFIX}{model._meta.label_lower}'
+
+
+def model_versions(*models):
+    """ A string that changes whenever a row of any of the models is saved or deleted. """
+    keys = sorted(_version_key(model) for model in models)
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return ':'.join(versions[key] for key in keys)
+
+
+def bump_model_version(model):
+    """ Replaces the version once the current transaction commits, so no reader caches the old rows under it. """
+    transaction.on_commit(lambda: cache.set(_version_key(model), uuid4().hex, None))
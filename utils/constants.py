@@ -1 +1,8 @@
-USE_PAGINATION = 'use_pagination'
\ No newline at end of file
+USE_PAGINATION = 'use_pagination'
+PAGINATION = 'pagination'
+CURSOR = 'cursor'
+COUNT = 'count'
+ESTIMATED = 'estimated'
+EXPORT = 'export'
+NDJSON = 'ndjson'
+CSV = 'csv'
\ No newline at end of file
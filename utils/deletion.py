@@ -0,0 +1,55 @@
+from django.db import models, transaction
+from django.db.models.deletion import ProtectedError, RestrictedError, get_candidate_relations_to_delete
+
+BULK_DELETE_BATCH_SIZE = 1000
+BLOCKING_ON_DELETE = (models.PROTECT, models.RESTRICT)
+
+
+def protected_ids(model, ids):
+    """
+    Ids referenced through a PROTECT/RESTRICT foreign key, one query per such relation.
+    Relations hidden with related_name='+' are included, as the deletion collector checks them too.
+    """
+    blocked = set()
+    for relation in get_candidate_relations_to_delete(model._meta):
+        if getattr(relation, 'on_delete', None) not in BLOCKING_ON_DELETE:
+            continue
+        field = relation.field
+        blocked.update(
+            relation.related_model._base_manager
+            .filter(**{f'{field.name}__in': ids})
+            .values_list(field.attname, flat=True)
+            .distinct()
+        )
+    return blocked
+
+
+def _delete_one_by_one(queryset, ids):
+    not_deleted = []
+    for pk in ids:
+        try:
+            with transaction.atomic():
+                queryset.filter(pk=pk).delete()
+        except (ProtectedError, RestrictedError):
+            not_deleted.append(pk)
+    return not_deleted
+
+
+def bulk_delete(queryset, ids, batch_size=BULK_DELETE_BATCH_SIZE):
+    """
+    Deletes the rows of queryset with the given ids in batches inside one transaction
+    and returns the ids that could not be deleted because they are still referenced.
+    Rows blocked only through a cascade are found when their batch fails and are retried one by one.
+    """
+    ids = set(queryset.filter(pk__in=ids).values_list('pk', flat=True))
+    not_deleted = protected_ids(queryset.model, ids)
+    deletable = sorted(ids - not_deleted)
+    with transaction.atomic():
+        for start in range(0, len(deletable), batch_size):
+            batch = deletable[start:start + batch_size]
+            try:
+                with transaction.atomic():
+                    queryset.filter(pk__in=batch).delete()
+            except (ProtectedError, RestrictedError):
+                not_deleted.update(_delete_one_by_one(queryset, batch))
+    return sorted(not_deleted)
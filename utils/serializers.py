@@ -1,9 +1,20 @@
 from rest_framework import serializers
 
 from account.models import User
+from api.fast import register_computed
+
+
+def thumbnail_avatar(avatar, avatar_source, avatar_thumbnail):
+    return User(avatar=avatar, avatar_source=avatar_source, avatar_thumbnail=avatar_thumbnail).thumbnail_avatar
+
+
+register_computed(User, 'thumbnail_avatar', ('avatar', 'avatar_source', 'avatar_thumbnail'), thumbnail_avatar)
 
 
 class ShortDescUserSerializer(serializers.ModelSerializer):
+    # Users are nested in lists, which only need the thumbnail
+    avatar = serializers.ImageField(source='thumbnail_avatar', read_only=True)
+
     class Meta:
         model = User
         fields = (